@@ -0,0 +1,114 @@
+"""Seeded synthetic Darwin Core occurrence data with realistic duplication of names, dates and coordinates."""
+from typing import Iterator, List
+import numpy
+from obisqc.model import Record
+from test.worms import TAXA
+
+# names on the stub annotated list, see benchmark.fixtures
+ANNOTATED_NAMES = ["Vinundu guellemei", "Unknown sp."]
+
+DATE_SHAPES = ["day", "day", "day", "month", "year", "datetime", "interval"]
+BASIS_OF_RECORD = ["HumanObservation", "HumanObservation", "PreservedSpecimen", "Occurrence", "MaterialSample", " HumanObservation", "humanobservation", "Observation"]
+OCCURRENCE_STATUS = ["present"] * 18 + ["absent", "Present "]
+
+
+def zipf_weights(n: int, exponent: float = 1.1) -> numpy.ndarray:
+    weights = 1 / numpy.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def make_names(rng: numpy.random.Generator, n: int) -> List[dict]:
+    """Taxonomy field sets, starting with names from the WoRMS fixture followed by unmatched names."""
+    names = []
+    for taxon in TAXA:
+        names.append({"scientificName": taxon["scientificname"]})
+        names.append({"scientificName": taxon["scientificname"], "scientificNameID": f"urn:lsid:marinespecies.org:taxname:{taxon['AphiaID']}"})
+        names.append({"scientificName": f"{taxon['scientificname']} {taxon['authority']}", "kingdom": taxon["kingdom"]})
+    for name in ANNOTATED_NAMES:
+        names.append({"scientificName": name})
+    for i in range(max(0, n - len(names))):
+        names.append({"scientificName": f"Genus{i % 997} species{i}", "family": f"Family{i % 89}"})
+    order = numpy.concatenate([numpy.arange(len(TAXA) * 3), rng.permutation(numpy.arange(len(TAXA) * 3, len(names)))])
+    return [names[i] for i in order]
+
+
+def make_dates(rng: numpy.random.Generator, n: int) -> List[str]:
+    years = rng.integers(1950, 2024, n)
+    months = rng.integers(1, 13, n)
+    days = rng.integers(1, 29, n)
+    hours = rng.integers(0, 24, n)
+    shapes = rng.choice(DATE_SHAPES, n)
+    dates = []
+    for year, month, day, hour, shape in zip(years.tolist(), months.tolist(), days.tolist(), hours.tolist(), shapes.tolist()):
+        if shape == "day":
+            dates.append(f"{year}-{month:02d}-{day:02d}")
+        elif shape == "month":
+            dates.append(f"{year}-{month:02d}")
+        elif shape == "year":
+            dates.append(f"{year}")
+        elif shape == "datetime":
+            dates.append(f"{year}-{month:02d}-{day:02d}T{hour:02d}:30:00Z")
+        else:
+            dates.append(f"{year}-{month:02d}-{day:02d}/{year}-{month:02d}-{min(day + 2, 28):02d}")
+    return dates
+
+
+def make_stations(rng: numpy.random.Generator, n: int) -> List[tuple]:
+    lon = numpy.round(rng.uniform(-180, 180, n), 3)
+    lat = numpy.round(rng.uniform(-80, 80, n), 3)
+    stations = [(str(x), str(y)) for x, y in zip(lon.tolist(), lat.tolist())]
+    stations[0] = ("0", "0")
+    stations[1] = (None, None)
+    stations[2] = ("200", "10")
+    return stations
+
+
+class Generator:
+    """Generate records in chunks. Names, dates and stations are drawn from pools sized relative to the number of
+    records, names with a long tailed distribution, so duplication rates resemble those of real datasets."""
+
+    def __init__(self, n: int, seed: int = 1):
+        self.n = n
+        self.rng = numpy.random.default_rng(seed)
+        self.names = make_names(self.rng, min(20000, max(50, n // 250)))
+        self.name_weights = zipf_weights(len(self.names))
+        self.dates = make_dates(self.rng, min(100000, max(20, n // 100)))
+        self.stations = make_stations(self.rng, min(200000, max(20, n // 200)))
+
+    def chunk(self, size: int) -> List[Record]:
+        rng = self.rng
+        names = rng.choice(len(self.names), size, p=self.name_weights).tolist()
+        dates = rng.integers(0, len(self.dates), size).tolist()
+        stations = rng.integers(0, len(self.stations), size).tolist()
+        min_depth = rng.integers(0, 200, size)
+        max_depth = min_depth + rng.integers(0, 50, size)
+        depth_missing = (rng.random(size) < 0.3).tolist()
+        basis = rng.choice(BASIS_OF_RECORD, size).tolist()
+        status = rng.choice(OCCURRENCE_STATUS, size).tolist()
+
+        records = []
+        for i in range(size):
+            lon, lat = self.stations[stations[i]]
+            data = {
+                "occurrenceStatus": status[i],
+                "basisOfRecord": basis[i],
+                "eventDate": self.dates[dates[i]],
+                "decimalLongitude": lon,
+                "decimalLatitude": lat,
+                "coordinateUncertaintyInMeters": "1000"
+            }
+            if not depth_missing[i]:
+                data["minimumDepthInMeters"] = str(min_depth[i])
+                data["maximumDepthInMeters"] = str(max_depth[i])
+            data.update(self.names[names[i]])
+            records.append(Record(data=data))
+        return records
+
+    def chunks(self, chunk_size: int = 100000) -> Iterator[List[Record]]:
+        for start in range(0, self.n, chunk_size):
+            yield self.chunk(min(chunk_size, self.n - start))
+
+
+def generate(n: int, seed: int = 1) -> List[Record]:
+    """Generate n records at once."""
+    return Generator(n, seed).chunk(n)
@@ -0,0 +1,70 @@
+"""Local stand-ins for the services used by obisqc: a WoRMS database built from the test fixture, a stub annotated
+list, a stand-in xylookup server and synthetic grids and areas for the local xylookup provider."""
+import json
+import os
+import tempfile
+from obisqc.util import aphia, xy_cache
+from test.grids import create_grids
+from test.worms import create_worms_db
+from test.xylookup_server import XYLookupServer
+
+ANNOTATIONS = [
+    {"scientificname": "Vinundu guellemei", "scientificnameid": None, "phylum": None, "class": None, "order": None, "family": None, "genus": None, "annotation_type": "black: no biota", "annotation_resolved_aphiaid": None},
+    {"scientificname": "Unknown sp.", "scientificnameid": None, "phylum": None, "class": None, "order": None, "family": None, "genus": None, "annotation_type": "black: unresolvable, looks like a scientific name", "annotation_resolved_aphiaid": None}
+]
+
+
+def create_areas(path: str) -> None:
+    """Create an area layer with a 10 by 10 degree grid of squares."""
+    features = []
+    for x in range(-180, 180, 10):
+        for y in range(-90, 90, 10):
+            features.append({
+                "type": "Feature",
+                "properties": {"id": f"{x}_{y}", "name": None},
+                "geometry": {"type": "Polygon", "coordinates": [[[x, y], [x + 10, y], [x + 10, y + 10], [x, y + 10], [x, y]]]}
+            })
+    with open(os.path.join(path, "grid10.geojson"), "w") as f:
+        json.dump({"type": "FeatureCollection", "features": features}, f)
+
+
+class Fixtures:
+    """Create all fixtures in a temporary directory and point obisqc to them, for use as a context manager."""
+
+    def __enter__(self) -> "Fixtures":
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = self.tempdir.name
+        create_worms_db(os.path.join(self.path, "worms.db"))
+        with open(os.path.join(self.path, "annotations.json"), "w") as f:
+            json.dump({"version": aphia.ANNOTATED_LIST_SNAPSHOT_VERSION, "created": "2024-01-01", "results": ANNOTATIONS}, f)
+        self.grids_path = os.path.join(self.path, "grids")
+        os.makedirs(self.grids_path)
+        create_grids(self.grids_path, 0.25)
+        create_areas(self.grids_path)
+        self.server = XYLookupServer().start()
+
+        self.environ = {key: os.environ.get(key) for key in ["WORMS_DB_PATH", "ANNOTATED_LIST_PATH", "XYLOOKUP_URL", "WORMS_MATCH_CACHE_PATH", "XYLOOKUP_CACHE_PATH"]}
+        os.environ["WORMS_DB_PATH"] = os.path.join(self.path, "worms.db")
+        os.environ["ANNOTATED_LIST_PATH"] = os.path.join(self.path, "annotations.json")
+        os.environ["XYLOOKUP_URL"] = self.server.url
+        os.environ.pop("WORMS_MATCH_CACHE_PATH", None)
+        os.environ.pop("XYLOOKUP_CACHE_PATH", None)
+        reset()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.server.stop()
+        for key, value in self.environ.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        reset()
+        self.tempdir.cleanup()
+
+
+def reset() -> None:
+    """Drop module level state which depends on the environment."""
+    aphia.close_connection()
+    aphia.annotated_list = None
+    xy_cache.default_cache = None
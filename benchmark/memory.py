@@ -0,0 +1,39 @@
+"""Measure the memory footprint of Record objects.
+
+Usage: python -m benchmark.memory [number of records]
+"""
+import sys
+import tracemalloc
+from obisqc.model import Record
+
+
+def make_record(i: int) -> Record:
+    record = Record(
+        occurrenceID=f"occ-{i}",
+        scientificName="Abra alba",
+        scientificNameID="urn:lsid:marinespecies.org:taxname:141433",
+        eventDate="2010-06-01",
+        decimalLongitude=str(2.1 + (i % 100) / 100),
+        decimalLatitude="51.3",
+        basisOfRecord="HumanObservation",
+        occurrenceStatus="present"
+    )
+    record.set_interpreted("decimalLongitude", 2.1 + (i % 100) / 100)
+    record.set_interpreted("decimalLatitude", 51.3)
+    record.set_missing("coordinateUncertaintyInMeters")
+    return record
+
+
+def measure(n: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = [make_record(i) for i in range(n)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(records) == n
+    return (after - before) / n
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print(f"{measure(n):.0f} bytes per record ({n} records)")
@@ -0,0 +1,38 @@
+"""Measure how check_parallel scales with the number of worker processes.
+
+Usage: python -m benchmark.parallel [number of records] [maximum number of workers]
+"""
+import os
+import random
+import sys
+from timeit import default_timer as timer
+from obisqc import check_parallel
+from obisqc.model import Record
+
+
+def make_records(n: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    return [Record(
+        occurrenceStatus=rng.choice(["present", "present", "absent"]),
+        basisOfRecord="HumanObservation",
+        eventDate=rng.choice(["2010", "2010-06", "2010-06-01", "2011-02-03T10:00:00"]),
+        decimalLongitude=str(round(rng.uniform(-10, 10), 2)),
+        decimalLatitude=str(round(rng.uniform(40, 60), 2)),
+        minimumDepthInMeters=str(rng.randint(0, 50)),
+        maximumDepthInMeters=str(rng.randint(50, 100))
+    ) for _ in range(n)]
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    workers = 1
+    baseline = None
+    while workers <= max_workers:
+        records = make_records(n)
+        start = timer()
+        check_parallel(records, workers=workers)
+        elapsed = timer() - start
+        baseline = baseline or elapsed
+        print(f"{workers} workers: {elapsed:.2f} s, {n / elapsed:.0f} records/s, speedup {baseline / elapsed:.2f}")
+        workers *= 2
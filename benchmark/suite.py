@@ -0,0 +1,141 @@
+"""Per stage throughput benchmarks on synthetic data, with all services replaced by local fixtures.
+
+Every stage and size is measured in a fresh process, records are generated in chunks outside of the timed sections.
+Results are written to a JSON file, pass an earlier results file with --compare to detect regressions.
+
+Usage: python -m benchmark.suite [--sizes 10000 1000000 10000000] [--stages time taxonomy ...] [--output results.json] [--compare baseline.json]
+"""
+from queue import Empty
+from timeit import default_timer as timer
+from typing import Callable, Dict, List
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import subprocess
+import sys
+import obisqc
+from obisqc import absence, fields, location, taxonomy, time
+from obisqc.model import Record
+from obisqc.util.local_xylookup import LocalXYLookup
+from benchmark.data import Generator
+from benchmark.fixtures import Fixtures
+
+SIZES = [10000, 1000000, 10000000]
+STAGES = ["absence", "fields", "time", "taxonomy", "location", "xylookup", "local_xylookup", "check"]
+CHUNK_SIZE = 100000
+
+
+def stages(fixtures: Fixtures) -> Dict[str, Callable[[List[Record], Dict], None]]:
+    """Stages to benchmark, each stage gets a chunk of records and a dict which is shared across chunks."""
+    provider = LocalXYLookup(fixtures.grids_path, areas_path=fixtures.grids_path)
+    return {
+        "absence": lambda records, state: absence.check(records),
+        "fields": lambda records, state: fields.check(records),
+        "time": lambda records, state: time.check(records, min_year=1582),
+        "taxonomy": lambda records, state: taxonomy.check(records, cache=state.setdefault("taxa", {})),
+        "location": lambda records, state: location.check(records),
+        "xylookup": lambda records, state: location.check(records, xylookup=True),
+        "local_xylookup": lambda records, state: location.check(records, xylookup=provider),
+        "check": lambda records, state: obisqc.check(records, taxon_cache=state.setdefault("taxa", {}))
+    }
+
+
+def measure(stage: str, n: int, seed: int, queue: multiprocessing.Queue) -> None:
+    try:
+        with Fixtures() as fixtures:
+            run = stages(fixtures)[stage]
+            state = {}
+            elapsed = 0
+            for records in Generator(n, seed).chunks(CHUNK_SIZE):
+                start = timer()
+                run(records, state)
+                elapsed += timer() - start
+    except Exception as e:
+        queue.put({"error": repr(e)})
+        raise
+    queue.put({
+        "seconds": round(elapsed, 3),
+        "records_per_second": round(n / elapsed),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    })
+
+
+def run_isolated(stage: str, n: int, seed: int) -> Dict:
+    """Measure a stage in a new process, spawned rather than forked because gnparser does not survive a fork."""
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=measure, args=(stage, n, seed, queue))
+    process.start()
+    while True:
+        try:
+            result = queue.get(timeout=1)
+            break
+        except Empty:
+            if not process.is_alive():
+                raise RuntimeError(f"Benchmark {stage} exited with code {process.exitcode}")
+    process.join()
+    if "error" in result:
+        raise RuntimeError(f"Benchmark {stage} failed: {result['error']}")
+    return result
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> bool:
+    """Print throughput relative to a baseline, returns False if any stage is slower than the threshold allows."""
+    ok = True
+    for size, size_results in results["results"].items():
+        for stage, result in size_results.items():
+            previous = baseline["results"].get(size, {}).get(stage)
+            if previous is None:
+                continue
+            ratio = result["records_per_second"] / previous["records_per_second"]
+            regression = ratio < 1 - threshold
+            ok = ok and not regression
+            print(f"{size:>10} {stage:<16} {ratio:6.2f}x {'REGRESSION' if regression else ''}")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="obisqc benchmark suite")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--stages", nargs="+", default=None)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", default=None, help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed relative slowdown when comparing")
+    args = parser.parse_args()
+
+    names = args.stages or STAGES
+    results = {
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seed": args.seed,
+        "results": {}
+    }
+    for n in args.sizes:
+        for stage in names:
+            result = run_isolated(stage, n, args.seed)
+            results["results"].setdefault(str(n), {})[stage] = result
+            print(f"{n:>10} {stage:<16} {result['records_per_second']:>10} records/s {result['peak_rss_mb']:>8} MB")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
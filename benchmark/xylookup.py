@@ -0,0 +1,23 @@
+"""Measure xylookup client throughput against the local stand-in server.
+
+Usage: python -m benchmark.xylookup [number of points] [server delay per request in seconds]
+"""
+import random
+import sys
+from timeit import default_timer as timer
+from obisqc.util import xylookup
+from test.xylookup_server import XYLookupServer
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    rng = random.Random(1)
+    points = [(rng.uniform(-180, 180), rng.uniform(-90, 90)) for _ in range(n)]
+    server = XYLookupServer(delay=delay).start()
+    for workers in [1, 2, 4, 8]:
+        start = timer()
+        xylookup.lookup(points, workers=workers, url=server.url)
+        elapsed = timer() - start
+        print(f"{workers} workers: {elapsed:.2f} s, {n / elapsed:.0f} points/s")
+    server.stop()
@@ -3,13 +3,36 @@ from obisqc import fields
 from obisqc import location
 from obisqc import taxonomy
 from obisqc import time
-from obisqc.model import Record
-from typing import List
+from obisqc.parallel import check as check_parallel
+from obisqc.table import check as check_table
+from obisqc.model import Record, Taxon
+from obisqc.util import misc
+from obisqc.util.metrics import Metrics, collect, count, timer
+from typing import Dict, Iterable, Iterator, List, Tuple
 
 
-def check(records: List[Record], xylookup: bool = False):
-    absence.check(records)
-    fields.check(records)
-    time.check(records, min_year=1582)
-    taxonomy.check(records)
-    location.check(records, xylookup=xylookup)
+def check(records: List[Record], xylookup: bool = False, taxon_cache: Dict[Tuple, Taxon] = None, metrics: Metrics = None):
+    """Run all checks. Timings, counts and cache statistics are added to metrics if provided."""
+    with collect(metrics):
+        count("records", len(records))
+        with timer("trim"):
+            for record in records:
+                record.trim_whitespace()
+        with timer("absence"):
+            absence.check(records)
+        with timer("fields"):
+            fields.check(records)
+        with timer("time"):
+            time.check(records, min_year=1582)
+        with timer("taxonomy"):
+            taxonomy.check(records, cache=taxon_cache, trim=False)
+        with timer("location"):
+            location.check(records, xylookup=xylookup)
+
+
+def check_iter(records: Iterable[Record], xylookup: bool = False, chunk_size: int = 10000, metrics: Metrics = None) -> Iterator[Record]:
+    """Check records in chunks and yield them when done, taxonomy results are shared across chunks."""
+    taxon_cache: Dict[Tuple, Taxon] = {}
+    for chunk in misc.chunks(records, chunk_size):
+        check(chunk, xylookup=xylookup, taxon_cache=taxon_cache, metrics=metrics)
+        yield from chunk
@@ -1,7 +1,8 @@
-from typing import List
+from typing import Dict, List
 from obisqc.model import Record
 from obisqc.util import misc
 import logging
+import numpy
 
 
 logger = logging.getLogger(__name__)
@@ -37,6 +38,45 @@ def check_record(record: Record) -> None:
         record.set_missing("occurrenceStatus")
 
 
+def check_columns(individual_count: List, occurrence_status: List) -> Dict[str, numpy.ndarray]:
+    """Columnar version of check_record, each distinct occurrenceStatus is lowercased once."""
+
+    count = misc.check_float_array(individual_count)
+    zero_count = count["valid"] & (count["float"] == 0)
+
+    statuses = {value: value.lower() for value in set(occurrence_status) if value is not None}
+    status = [statuses[value] if value is not None else None for value in occurrence_status]
+    status_present = numpy.array([value is not None for value in status], dtype=bool)
+    absent = numpy.array([value == "absent" for value in status], dtype=bool)
+    present = numpy.array([value == "present" for value in status], dtype=bool)
+
+    return {
+        "absence": zero_count | absent,
+        "individualCount": {
+            "invalid": count["present"] & ~count["valid"]
+        },
+        "occurrenceStatus": {
+            "missing": ~status_present,
+            "invalid": status_present & ~absent & (~present | zero_count)
+        }
+    }
+
+
 def check(records: List[Record]):
-    for record in records:
-        check_record(record)
+    columns = check_columns(
+        individual_count=[record.get("individualCount") for record in records],
+        occurrence_status=[record.get("occurrenceStatus") for record in records]
+    )
+    absence = columns["absence"].tolist()
+    count_invalid = columns["individualCount"]["invalid"].tolist()
+    status_missing = columns["occurrenceStatus"]["missing"].tolist()
+    status_invalid = columns["occurrenceStatus"]["invalid"].tolist()
+
+    for i, record in enumerate(records):
+        record.absence = absence[i]
+        if count_invalid[i]:
+            record.set_invalid("individualCount")
+        if status_missing[i]:
+            record.set_missing("occurrenceStatus")
+        elif status_invalid[i]:
+            record.set_invalid("occurrenceStatus")
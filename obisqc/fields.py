@@ -1,11 +1,11 @@
 import logging
-from typing import List
+from typing import Dict, List
+import numpy
 from obisqc.model import Record
 from obisqc.util import vocabularies
 
 
 logger = logging.getLogger(__name__)
-vocabs = vocabularies.get_vocabularies()
 
 
 def check_record(record: Record) -> None:
@@ -14,12 +14,36 @@ def check_record(record: Record) -> None:
     # basisOfRecord
 
     if record.get("basisOfRecord") is not None:
-        if not record.get("basisOfRecord").lower() in [value.lower() for value in vocabs["dwc:basisOfRecord"]]:
+        if not record.get("basisOfRecord").lower() in vocabularies.get_vocabulary("dwc:basisOfRecord"):
             record.set_invalid("basisOfRecord")
     else:
         record.set_missing("basisOfRecord")
 
 
+def check_columns(basis_of_record: List) -> Dict[str, numpy.ndarray]:
+    """Check a column of basisOfRecord values against the vocabulary, each distinct value is checked once."""
+
+    vocabulary = vocabularies.get_vocabulary("dwc:basisOfRecord")
+    distinct = {value: value.lower() in vocabulary for value in set(basis_of_record) if value is not None}
+    present = numpy.array([value is not None for value in basis_of_record], dtype=bool)
+    valid = numpy.array([distinct[value] if value is not None else False for value in basis_of_record], dtype=bool)
+
+    return {
+        "basisOfRecord": {
+            "present": present,
+            "invalid": present & ~valid
+        }
+    }
+
+
 def check(records: List[Record]) -> None:
-    for record in records:
-        check_record(record)
+    columns = check_columns([record.get("basisOfRecord") for record in records])
+    present = columns["basisOfRecord"]["present"].tolist()
+    invalid = columns["basisOfRecord"]["invalid"].tolist()
+
+    for i, record in enumerate(records):
+        if present[i]:
+            if invalid[i]:
+                record.set_invalid("basisOfRecord")
+        else:
+            record.set_missing("basisOfRecord")
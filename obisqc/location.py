@@ -1,12 +1,16 @@
-from typing import Dict, List
+from typing import Dict, List, Union
 from obisqc.model import Record
-from obisqc.util import misc
+from obisqc.util import metrics, misc
+from obisqc.util.local_xylookup import LocalXYLookup
 import logging
 from obisqc.util.flags import Flag
 import numpy
 
 logger = logging.getLogger(__name__)
 
+FLOAT_FIELDS = ["coordinateUncertaintyInMeters", "decimalLongitude", "decimalLatitude", "minimumDepthInMeters", "maximumDepthInMeters"]
+FLAG_COLUMNS = ["lon_out_of_range", "lat_out_of_range", "no_coord", "zero_coord", "depth_out_of_range", "no_depth", "min_depth_exceeds_max"]
+
 
 def check_record(record: Record) -> None:
     """Check location related fields."""
@@ -118,9 +122,10 @@ def check_xy(record: Record, xy: Dict) -> None:
 
     # shoredistance
 
-    record.set_interpreted("shoredistance", xy["shoredistance"])
-    if xy["shoredistance"] < 0:
-        record.set_flag(Flag.ON_LAND)
+    if "shoredistance" in xy:
+        record.set_interpreted("shoredistance", xy["shoredistance"])
+        if xy["shoredistance"] < 0:
+            record.set_flag(Flag.ON_LAND)
 
     # areas
 
@@ -140,11 +145,88 @@ def check_xy(record: Record, xy: Dict) -> None:
         record.set_interpreted("bathymetry", round(xy["grids"]["bathymetry"], 2))
 
 
-def check(records: List[Record], xylookup: bool = False) -> None:
-    for record in records:
-        check_record(record)
+def check_columns(longitude, latitude, uncertainty, minimum_depth, maximum_depth) -> Dict[str, numpy.ndarray]:
+    """Check location related fields for columns of verbatim values, this is the vectorized version of check_record."""
+
+    unc_check = misc.check_float_array(uncertainty, [1, 20037509])
+    lon_check = misc.check_float_array(longitude, [-180, 180])
+    lat_check = misc.check_float_array(latitude, [-90, 90])
+    min_check = misc.check_float_array(minimum_depth, [-100000, 11000])
+    max_check = misc.check_float_array(maximum_depth, [-100000, 11000])
+
+    both_depths = min_check["valid"] & max_check["valid"]
+
+    return {
+        "coordinateUncertaintyInMeters": unc_check,
+        "decimalLongitude": lon_check,
+        "decimalLatitude": lat_check,
+        "minimumDepthInMeters": min_check,
+        "maximumDepthInMeters": max_check,
+        "lon_out_of_range": lon_check["present"] & ~lon_check["valid"],
+        "lat_out_of_range": lat_check["present"] & ~lat_check["valid"],
+        "no_coord": ~lon_check["valid"] | ~lat_check["valid"],
+        "zero_coord": lon_check["valid"] & lat_check["valid"] & (lon_check["float"] == 0) & (lat_check["float"] == 0),
+        "depth_out_of_range": (min_check["parsed"] & ~min_check["in_range"]) | (max_check["parsed"] & ~max_check["in_range"]),
+        "no_depth": ~min_check["valid"] & ~max_check["valid"],
+        "min_depth_exceeds_max": both_depths & (min_check["float"] > max_check["float"]),
+        "depth": numpy.where(both_depths, (min_check["float"] + max_check["float"]) / 2, numpy.fmax(min_check["float"], max_check["float"]))
+    }
+
+
+def apply_float(record: Record, field: str, present: bool, valid: bool, value: float) -> None:
+    """Write the check_float_array result for a single field to a record."""
+    if present:
+        if valid:
+            record.set_interpreted(field, value)
+        else:
+            record.set_invalid(field)
+    else:
+        record.set_missing(field)
+
+
+def check(records: List[Record], xylookup: Union[bool, LocalXYLookup] = False) -> None:
+    """Check coordinates and depths. If xylookup is True, coordinates are looked up with the xylookup service, a
+    LocalXYLookup can be passed instead to look them up offline."""
+
+    columns = check_columns(
+        longitude=[record.get("decimalLongitude") for record in records],
+        latitude=[record.get("decimalLatitude") for record in records],
+        uncertainty=[record.get("coordinateUncertaintyInMeters") for record in records],
+        minimum_depth=[record.get("minimumDepthInMeters") for record in records],
+        maximum_depth=[record.get("maximumDepthInMeters") for record in records]
+    )
+    results = {field: list(zip(*[columns[field][key].tolist() for key in ["present", "valid", "float"]])) for field in FLOAT_FIELDS}
+    flags = {key: columns[key].tolist() for key in FLAG_COLUMNS}
+    depth = columns["depth"]
+
+    for i, record in enumerate(records):
+        for field in ["coordinateUncertaintyInMeters", "decimalLongitude"]:
+            apply_float(record, field, *results[field][i])
+        if flags["lon_out_of_range"][i]:
+            record.set_flag(Flag.LON_OUT_OF_RANGE)
+        apply_float(record, "decimalLatitude", *results["decimalLatitude"][i])
+        if flags["lat_out_of_range"][i]:
+            record.set_flag(Flag.LAT_OUT_OF_RANGE)
+        if flags["no_coord"][i]:
+            record.set_flag(Flag.NO_COORD)
+            record.dropped = True
+        if flags["zero_coord"][i]:
+            record.set_flag(Flag.ZERO_COORD)
+            record.dropped = True
+        for field in ["minimumDepthInMeters", "maximumDepthInMeters"]:
+            apply_float(record, field, *results[field][i])
+        if flags["depth_out_of_range"][i]:
+            record.set_flag(Flag.DEPTH_OUT_OF_RANGE)
+        if flags["no_depth"][i]:
+            record.set_flag(Flag.NO_DEPTH)
+        else:
+            if flags["min_depth_exceeds_max"][i]:
+                record.set_flag(Flag.MIN_DEPTH_EXCEEDS_MAX)
+            record.set_interpreted("depth", depth[i])
+
     if xylookup:
-        xy = misc.do_xylookup(records)
+        with metrics.timer("location.xylookup"):
+            xy = misc.do_xylookup(records, provider=None if xylookup is True else xylookup)
         assert len(xy) == len(records)
         for i in range(len(records)):
             if xy[i] is not None:
@@ -1,6 +1,7 @@
 from __future__ import annotations
-from typing import Any, Dict, List
-from obisqc.util.flags import Flag
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Tuple
+from obisqc.util.flags import Flag, FlagSet
 import hashlib
 import json
 from abc import ABC, abstractmethod
@@ -16,30 +17,48 @@ RANKS = [
 ]
 RANK_IDS = [r + "id" for r in RANKS]
 TAXONOMY_FIELDS = RANKS + RANK_IDS + ["aphiaid", "unaccepted", "taxonID", "scientificNameID", "acceptedNameUsageID", "parentNameUsageID", "originalNameUsageID", "taxonConceptID", "scientificName", "acceptedNameUsage", "parentNameUsage", "originalNameUsage", "higherClassification", "genericName", "infragenericEpithet", "specificEpithet", "infraspecificEpithet", "cultivarEpithet", "taxonRank", "verbatimTaxonRank", "scientificNameAuthorship", "vernacularName", "nomenclaturalCode", "taxonomicStatus", "nomenclaturalStatus", "marine", "brackish", "redlist_category", "hab", "wrims"]
+TAXONOMY_FIELD_SET = frozenset(TAXONOMY_FIELDS)
+
+
+class NotInterpreted:
+    """Sentinel type for fields without an interpreted value."""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return "NOT_INTERPRETED"
+
+    def __reduce__(self):
+        return "NOT_INTERPRETED"
+
+
+NOT_INTERPRETED = NotInterpreted()
 
 
 class Field:
 
-    def __init__(self, value=None, invalid=None, missing=None, **kwargs):
+    __slots__ = ("verbatim", "invalid", "missing", "interpreted")
+
+    def __init__(self, value=None, invalid=None, missing=None, interpreted=NOT_INTERPRETED):
         self.verbatim = value
         self.invalid = invalid
         self.missing = missing
-
-        for k, v in kwargs.items():
-            if k == "interpreted":
-                self.interpreted = v
+        self.interpreted = interpreted
 
 
 class Record:
 
+    __slots__ = ("type", "absence", "dropped", "_fields", "flags", "taxon", "_extensions", "_extras")
+
     def __init__(self, data: Dict = None, **kwargs):
         self.type: str = None
         self.absence: bool = None
         self.dropped: bool = None
-        self.fields: Dict[str, Field] = {}
-        self.flags: List[Flag] = []
-        self.extensions: Dict[str, List[Record]] = {}
-        self.extras: Dict[str, Any] = {}
+        self._fields: Dict[str, Field] = {}
+        self.flags: FlagSet = FlagSet()
+        self.taxon: Taxon = None
+        self._extensions: Dict[str, List[Record]] = None
+        self._extras: Dict[str, Any] = None
 
         if data is not None:
             for key, value in data.items():
@@ -48,50 +67,120 @@ class Record:
         for key, value in kwargs.items():
             self.set(key, value)
 
+    @property
+    def extensions(self) -> Dict[str, List[Record]]:
+        if self._extensions is None:
+            self._extensions = {}
+        return self._extensions
+
+    @extensions.setter
+    def extensions(self, value: Dict[str, List[Record]]) -> None:
+        self._extensions = value
+
+    @property
+    def extras(self) -> Dict[str, Any]:
+        if self._extras is None:
+            self._extras = {}
+        return self._extras
+
+    @extras.setter
+    def extras(self, value: Dict[str, Any]) -> None:
+        self._extras = value
+
+    def get_field(self, field: str) -> Field:
+        """Get a field, taxonomy fields resolve through the shared taxon once it has been merged."""
+        value = self._fields.get(field)
+        if value is None and self.taxon is not None and field in TAXONOMY_FIELD_SET:
+            return self.taxon._fields.get(field)
+        return value
+
+    @property
+    def fields(self) -> Mapping[str, Field]:
+        """All fields of the record, see get_fields()."""
+        return self.get_fields()
+
+    @fields.setter
+    def fields(self, value: Mapping[str, Field]) -> None:
+        self._fields = dict(value)
+
+    def get_fields(self) -> Mapping[str, Field]:
+        """Get a read only view of all fields. Once a taxon has been merged the view also holds the taxonomy fields of
+        the taxon, these Field objects are shared with other records. Change fields through the setters, or through
+        own_field() which copies a shared field to the record first."""
+        if self.taxon is None:
+            return MappingProxyType(self._fields)
+        taxon_fields = {field: value for field, value in self.taxon._fields.items() if field in TAXONOMY_FIELD_SET}
+        return MappingProxyType({**taxon_fields, **self._fields})
+
+    def own_field(self, field: str) -> Field:
+        """Get a field for writing, a taxonomy field shared with the taxon is copied to the record first."""
+        if field in self._fields:
+            return self._fields[field]
+        value = self.get_field(field)
+        if value is not None:
+            value = Field(value.verbatim, value.invalid, value.missing, value.interpreted)
+            self._fields[field] = value
+        return value
+
     def get(self, field: str):
-        return self.fields[field].verbatim if field in self.fields else None
+        value = self.get_field(field)
+        return value.verbatim if value is not None else None
 
     def set(self, field: str, value) -> None:
-        self.fields[field] = Field(value if value != "" else None)
+        self._fields[field] = Field(value if value != "" else None)
 
     def get_interpreted(self, field: str):
-        return self.fields[field].interpreted if field in self.fields and hasattr(self.fields[field], "interpreted") else None
+        value = self.get_field(field)
+        if value is not None and value.interpreted is not NOT_INTERPRETED:
+            return value.interpreted
+        return None
 
     def has_interpreted(self, field: str):
-        return field in self.fields and hasattr(self.fields[field], "interpreted")
+        value = self.get_field(field)
+        return value is not None and value.interpreted is not NOT_INTERPRETED
 
     def set_interpreted(self, field: str, value) -> None:
-        if field not in self.fields:
-            self.fields[field] = Field(interpreted=value)
+        own = self.own_field(field)
+        if own is None:
+            self._fields[field] = Field(interpreted=value)
         else:
-            self.fields[field].interpreted = value
+            own.interpreted = value
 
     def is_missing(self, field: str) -> bool:
-        return self.fields[field].missing if field in self.fields else False
+        value = self.get_field(field)
+        return value.missing if value is not None else False
 
     def set_missing(self, field: str, value: bool = True) -> None:
-        if field not in self.fields:
-            self.fields[field] = Field(missing=value)
+        own = self.own_field(field)
+        if own is None:
+            self._fields[field] = Field(missing=value)
         else:
-            self.fields[field].missing = value
+            own.missing = value
 
     def is_invalid(self, field: str) -> bool:
-        return self.fields[field].invalid
+        value = self.get_field(field)
+        if value is None:
+            raise KeyError(field)
+        return value.invalid
 
     def set_invalid(self, field: str, value: bool = True):
-        if field not in self.fields:
-            self.fields[field] = Field(invalid=value)
+        own = self.own_field(field)
+        if own is None:
+            self._fields[field] = Field(invalid=value)
         else:
-            self.fields[field].invalid = value
+            own.invalid = value
 
     def set_flag(self, flag: Flag) -> None:
-        if flag not in self.flags:
-            self.flags.append(flag)
+        self.flags.add(flag)
 
     def trim_whitespace(self) -> None:
-        for field in self.fields:
-            if isinstance(self.get(field), str):
-                self.set(field, self.get(field).strip())
+        """Trim whitespace from verbatim values in place, keeping field state. Clean values are left untouched."""
+        for value in self._fields.values():
+            verbatim = value.verbatim
+            if isinstance(verbatim, str):
+                stripped = verbatim.strip()
+                if len(stripped) != len(verbatim):
+                    value.verbatim = stripped if stripped != "" else None
 
     def get_taxonomy(self) -> Taxon:
         record = Taxon()
@@ -99,12 +188,24 @@ class Record:
             record.set(field, self.get(field))
         return record
 
+    def get_taxonomy_key(self) -> Tuple:
+        """Get a hashable key of the non-null taxonomy values, equal keys have equal taxonomy. Expects trimmed values,
+        see trim_whitespace()."""
+        key = []
+        for field, value in self.get_fields().items():
+            if field in TAXONOMY_FIELD_SET and value.verbatim is not None:
+                key.append((field, value.verbatim))
+        key.sort()
+        return tuple(key)
+
     def merge_taxonomy(self, other: Taxon) -> None:
-        for field in TAXONOMY_FIELDS:
-            self.fields[field] = other.fields[field]
+        """Attach a checked taxon, taxonomy fields of the record resolve through the shared taxon from now on."""
+        for field in [field for field in self._fields if field in TAXONOMY_FIELD_SET]:
+            del self._fields[field]
+        self.taxon = other
 
     def get_hash(self) -> str:
-        record_dict = {field: self.get(field) for field in self.fields}
+        record_dict = {field: self.get(field) for field in self.get_fields()}
         dhash = hashlib.md5()
         encoded = json.dumps(record_dict, sort_keys=True).encode()
         dhash.update(encoded)
@@ -113,6 +214,8 @@ class Record:
 
 class Taxon(Record):
 
+    __slots__ = ("aphiaid", "aphia_info", "aphia_info_accepted")
+
     def __init__(self):
         Record.__init__(self)
         self.aphiaid: int = None
@@ -0,0 +1,63 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, List, Tuple
+from obisqc import absence
+from obisqc import fields
+from obisqc import location
+from obisqc import taxonomy
+from obisqc import time
+from obisqc.model import Record, Taxon
+from obisqc.util import misc
+import logging
+import multiprocessing
+
+
+logger = logging.getLogger(__name__)
+
+
+def check_records(data: List[Dict], xylookup: bool = False) -> List[Record]:
+    """Run the per record checks on a chunk of raw field dicts."""
+    records = [Record(data=item) for item in data]
+    absence.check(records)
+    fields.check(records)
+    time.check(records, min_year=1582)
+    location.check(records, xylookup=xylookup)
+    return records
+
+
+def check_taxa(taxa: Dict[Tuple, Taxon]) -> Dict[Tuple, Taxon]:
+    """Run taxonomic quality control on a chunk of distinct taxa."""
+    taxonomy.check_taxa(taxa)
+    taxonomy.interpret(taxa)
+    return taxa
+
+
+def check(records: List[Record], xylookup: bool = False, workers: int = None, chunk_size: int = 10000, taxa_chunk_size: int = 1000) -> None:
+    """Run all checks on a pool of worker processes. Only raw field dicts are sent to the workers, and taxonomy is
+    deduplicated over all records before distinct taxa are split among the workers. Workers are spawned rather than
+    forked, a forked child hangs when the name parser has already been loaded in this process."""
+
+    for record in records:
+        record.trim_whitespace()
+    taxa, indexes = taxonomy.group(records)
+    logger.debug("Checking %s records and %s taxonomy field sets with %s workers" % (len(records), len(taxa), workers))
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        taxa_futures = [executor.submit(check_taxa, dict(chunk)) for chunk in misc.chunks(taxa.items(), taxa_chunk_size)]
+        data = ({field: record.get(field) for field in record.get_fields()} for record in records)
+        results = executor.map(check_records, misc.chunks(data, chunk_size), repeat(xylookup))
+
+        index = 0
+        for chunk in results:
+            for result in chunk:
+                record = records[index]
+                record.absence = result.absence
+                record.dropped = result.dropped
+                record.fields = result.fields
+                record.flags = result.flags
+                index += 1
+
+        for future in taxa_futures:
+            taxa.update(future.result())
+
+    taxonomy.merge(records, taxa, indexes)
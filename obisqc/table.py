@@ -0,0 +1,145 @@
+from typing import Dict, List, Tuple
+import logging
+import numpy
+from obisqc import absence, fields, location, taxonomy, time
+from obisqc.model import Taxon
+from obisqc.util.flags import Flag, FLAG_BITS
+from obisqc.util.metrics import Metrics, collect, count, timer
+
+
+logger = logging.getLogger(__name__)
+
+INPUT_FIELDS = ["individualCount", "occurrenceStatus", "basisOfRecord", "eventDate", "decimalLongitude", "decimalLatitude", "coordinateUncertaintyInMeters", "minimumDepthInMeters", "maximumDepthInMeters"]
+LOCATION_FLAGS = {
+    "lon_out_of_range": Flag.LON_OUT_OF_RANGE,
+    "lat_out_of_range": Flag.LAT_OUT_OF_RANGE,
+    "no_coord": Flag.NO_COORD,
+    "zero_coord": Flag.ZERO_COORD,
+    "depth_out_of_range": Flag.DEPTH_OUT_OF_RANGE,
+    "no_depth": Flag.NO_DEPTH
+}
+TAXONOMY_COLUMNS = ["scientificName", "aphiaid", "unaccepted", "marine", "brackish", "terrestrial", "kingdom", "phylum", "class", "order", "family", "genus", "species"]
+
+
+def to_columns(table) -> Tuple[Dict[str, List], int]:
+    """Convert a pandas DataFrame, Arrow table or dict of sequences to a dict of lists with None for missing values."""
+
+    if hasattr(table, "to_pydict"):
+        columns = table.to_pydict()
+    elif hasattr(table, "to_dict") and hasattr(table, "notna"):
+        columns = {str(name): column.tolist() for name, column in table.astype(object).where(table.notna(), None).items()}
+    else:
+        columns = {name: list(column) for name, column in table.items()}
+    lengths = {len(column) for column in columns.values()}
+    if len(lengths) > 1:
+        raise RuntimeError("All columns should have the same length")
+    return columns, lengths.pop() if len(lengths) > 0 else 0
+
+
+def trim(column: List) -> List:
+    """Trim whitespace from string values, empty strings become None."""
+    trimmed = []
+    for value in column:
+        if isinstance(value, str):
+            value = value.strip()
+            if value == "":
+                value = None
+        trimmed.append(value)
+    return trimmed
+
+
+def from_columns(table, columns: Dict[str, numpy.ndarray]):
+    """Return the results in the same kind of container as the input table."""
+    if hasattr(table, "to_pydict"):
+        import pyarrow
+        return pyarrow.table({name: pyarrow.array(column, from_pandas=True) for name, column in columns.items()})
+    elif hasattr(table, "to_dict") and hasattr(table, "notna"):
+        import pandas
+        return pandas.DataFrame(columns, index=table.index)
+    return columns
+
+
+def check(table, min_year: int = 1582, taxon_cache: Dict[Tuple, Taxon] = None, metrics: Metrics = None):
+    """Run all checks on a columnar table of Darwin Core terms, without creating records. Accepts a pandas DataFrame,
+    an Arrow table or a dict of columns, and returns new columns in the same kind of container: a flags bitmask (see
+    obisqc.util.flags.FLAG_BITS), dropped, absence, basisOfRecord_missing and basisOfRecord_invalid, interpreted
+    coordinates, depth, dates and taxonomy. Coordinates are not looked up with xylookup. Timings and counts are added
+    to metrics if provided."""
+
+    with collect(metrics):
+        with timer("trim"):
+            columns, n = to_columns(table)
+            columns = {name: trim(column) for name, column in columns.items()}
+            for field in INPUT_FIELDS + ["scientificName"]:
+                if field not in columns:
+                    columns[field] = [None] * n
+        count("records", n)
+
+        with timer("absence"):
+            absence_columns = absence.check_columns(columns["individualCount"], columns["occurrenceStatus"])
+        with timer("fields"):
+            fields_columns = fields.check_columns(columns["basisOfRecord"])
+        with timer("location"):
+            location_columns = location.check_columns(
+                longitude=columns["decimalLongitude"],
+                latitude=columns["decimalLatitude"],
+                uncertainty=columns["coordinateUncertaintyInMeters"],
+                minimum_depth=columns["minimumDepthInMeters"],
+                maximum_depth=columns["maximumDepthInMeters"]
+            )
+
+        # flags and dropped from location
+
+        flags = numpy.zeros(n, dtype=numpy.int64)
+        for key, flag in LOCATION_FLAGS.items():
+            flags[location_columns[key]] |= FLAG_BITS[flag]
+        flags[location_columns["min_depth_exceeds_max"]] |= FLAG_BITS[Flag.MIN_DEPTH_EXCEEDS_MAX]
+        dropped = location_columns["no_coord"] | location_columns["zero_coord"]
+
+        # dates, each distinct eventDate is interpreted once
+
+        event_dates = columns["eventDate"]
+        with timer("time"):
+            dates = time.interpret_distinct(event_dates, min_year)
+        date_columns = {name: numpy.full(n, numpy.nan) for name in ["date_start", "date_mid", "date_end", "date_year"]}
+        for i, event_date in enumerate(event_dates):
+            if event_date is not None:
+                ms_start, ms_mid, ms_end, year, flag, invalid = dates[event_date]
+                if flag is not None:
+                    flags[i] |= FLAG_BITS[flag]
+                if not invalid:
+                    for name, value in zip(date_columns, (ms_start, ms_mid, ms_end, year)):
+                        if value is not None:
+                            date_columns[name][i] = value
+
+        # taxonomy, each distinct set of taxonomy fields is checked once
+
+        with timer("taxonomy"):
+            with timer("taxonomy.group"):
+                taxa, keys = taxonomy.group_columns(columns)
+            count("taxonomy.keys", len(taxa))
+            taxonomy.check_distinct(taxa, taxon_cache)
+        taxon_flags = {key: int(taxon.flags) for key, taxon in taxa.items()}
+        taxon_columns = {name: [None] * n for name in TAXONOMY_COLUMNS}
+        for i, key in enumerate(keys):
+            taxon = taxa[key]
+            flags[i] |= taxon_flags[key]
+            if taxon.dropped:
+                dropped[i] = True
+            for name in TAXONOMY_COLUMNS:
+                taxon_columns[name][i] = taxon.get_interpreted(name)
+
+        results = {
+            "flags": flags,
+            "dropped": dropped,
+            "absence": absence_columns["absence"],
+            "basisOfRecord_missing": ~fields_columns["basisOfRecord"]["present"],
+            "basisOfRecord_invalid": fields_columns["basisOfRecord"]["invalid"]
+        }
+        for field in ["decimalLongitude", "decimalLatitude", "coordinateUncertaintyInMeters", "minimumDepthInMeters", "maximumDepthInMeters"]:
+            results[field] = location_columns[field]["float"]
+        results["depth"] = location_columns["depth"]
+        results.update(date_columns)
+        results.update(taxon_columns)
+
+        return from_columns(table, results)
@@ -1,9 +1,10 @@
-from typing import Dict, List
-from obisqc.model import Record, RANKS, RANK_IDS
+from typing import Dict, List, Tuple
+from obisqc.model import Record, RANKS, RANK_IDS, TAXONOMY_FIELDS, TAXONOMY_FIELD_SET
 from obisqc.util.aphia import match_worms, check_annotated_list, fetch, detect_lsid, detect_external
 import logging
 from obisqc.model import AphiaInfo, Taxon
-from obisqc.util.flags import Flag
+from obisqc.util import metrics
+from obisqc.util.flags import Flag, add_flags
 from obisqc.util.aphia import is_accepted, convert_environment
 
 
@@ -23,39 +24,63 @@ def check_fields(taxa: Dict[str, AphiaInfo]) -> None:
 def check_taxa(taxa: Dict[str, AphiaInfo]) -> None:
     """Run all steps for taxonomic quality control."""
 
-    check_fields(taxa)
-    detect_lsid(taxa)
-    detect_external(taxa)
-    match_worms(taxa)
-    check_annotated_list(taxa)
-    fetch(taxa)
+    with metrics.timer("taxonomy.check_fields"):
+        check_fields(taxa)
+    with metrics.timer("taxonomy.detect_lsid"):
+        detect_lsid(taxa)
+    with metrics.timer("taxonomy.detect_external"):
+        detect_external(taxa)
+    with metrics.timer("taxonomy.match_worms"):
+        match_worms(taxa)
+    with metrics.timer("taxonomy.annotated_list"):
+        check_annotated_list(taxa)
+    with metrics.timer("taxonomy.fetch"):
+        fetch(taxa)
 
 
-def check(records: List[Record]) -> None:
+def group(records: List[Record]) -> Tuple[Dict[Tuple, Taxon], Dict[Tuple, List[int]]]:
+    """Map records to distinct sets of taxonomic information, records are expected to be trimmed. A Taxon is only
+    created for the first record with a given taxonomy key."""
 
-    # first map all input rows to sets of taxonomic information
-
-    taxa: Dict[str, Taxon] = {}
-    indexes: Dict[str, List[str]] = {}
+    taxa: Dict[Tuple, Taxon] = {}
+    indexes: Dict[Tuple, List[int]] = {}
 
     for index, record in enumerate(records):
-        record.trim_whitespace()
-        taxonomy = record.get_taxonomy()
-        hash = taxonomy.get_hash()
-        if hash in indexes:
-            indexes[hash].append(index)
+        key = record.get_taxonomy_key()
+        if key in indexes:
+            indexes[key].append(index)
         else:
-            taxa[hash] = taxonomy
-            indexes[hash] = [index]
+            taxa[key] = record.get_taxonomy()
+            indexes[key] = [index]
 
-    # submit all sets of taxonomic information to the aphia component
+    return taxa, indexes
+
+
+def group_columns(columns: Dict[str, List]) -> Tuple[Dict[Tuple, Taxon], List[Tuple]]:
+    """Map table rows to distinct sets of taxonomic information, values are expected to be trimmed with empty strings
+    replaced by None. Returns the taxa and the taxonomy key of every row, keys are compatible with Record.get_taxonomy_key."""
+
+    fields = sorted(field for field in columns if field in TAXONOMY_FIELD_SET)
+    taxa: Dict[Tuple, Taxon] = {}
+    keys: List[Tuple] = []
+
+    for values in zip(*[columns[field] for field in fields]):
+        key = tuple((field, value) for field, value in zip(fields, values) if value is not None)
+        if key not in taxa:
+            taxon = Taxon()
+            taxonomy = dict(key)
+            for field in TAXONOMY_FIELDS:
+                taxon.set(field, taxonomy.get(field))
+            taxa[key] = taxon
+        keys.append(key)
 
-    logger.debug("Checking %s taxonomy field sets" % (len(taxa.keys())))
-    check_taxa(taxa)
+    return taxa, keys
 
-    # process aphia results
 
-    for hash, taxon in taxa.items():
+def interpret(taxa: Dict[Tuple, Taxon]) -> None:
+    """Populate interpreted fields and flags from the Aphia results."""
+
+    for key, taxon in taxa.items():
 
         if taxon.aphia_info is None:
             taxon.set_flag(Flag.NO_MATCH)
@@ -110,13 +135,59 @@ def check(records: List[Record]) -> None:
             elif taxon.get_interpreted("marine") is not True and taxon.get_interpreted("brackish") is not True:
                 taxon.set_flag(Flag.MARINE_UNSURE)
 
-    # merge results back into records
 
-    for hash, taxon in taxa.items():
+def merge(records: List[Record], taxa: Dict[Tuple, Taxon], indexes: Dict[Tuple, List[int]]) -> None:
+    """Merge checked taxa back into records."""
 
-        for index in indexes[hash]:
+    for key, taxon in taxa.items():
+
+        taxon_records = [records[index] for index in indexes[key]]
+        add_flags(taxon_records, taxon.flags)
+
+        for record in taxon_records:
 
             if taxon.dropped:
-                records[index].dropped = True
-            records[index].flags.extend(taxon.flags)
-            records[index].merge_taxonomy(taxon)
+                record.dropped = True
+            record.merge_taxonomy(taxon)
+
+
+def check_distinct(taxa: Dict[Tuple, Taxon], cache: Dict[Tuple, Taxon] = None) -> None:
+    """Check distinct taxa in place. Taxa in the optional cache are reused, newly checked taxa are added to it."""
+
+    if cache is not None:
+        for key in taxa:
+            if key in cache:
+                taxa[key] = cache[key]
+        new_taxa = {key: taxon for key, taxon in taxa.items() if key not in cache}
+        metrics.count("taxonomy.cached", len(taxa) - len(new_taxa))
+        cache.update(new_taxa)
+    else:
+        new_taxa = taxa
+
+    # submit all sets of taxonomic information to the aphia component
+
+    logger.debug("Checking %s taxonomy field sets" % (len(new_taxa.keys())))
+    check_taxa(new_taxa)
+    with metrics.timer("taxonomy.interpret"):
+        interpret(new_taxa)
+
+
+def check(records: List[Record], cache: Dict[Tuple, Taxon] = None, trim: bool = True) -> None:
+    """Check taxonomy for a list of records. Taxa in the optional cache are reused, newly checked taxa are added to it.
+    Pass trim=False if whitespace has already been trimmed from the records."""
+
+    # first map all input rows to sets of taxonomic information
+
+    if trim:
+        for record in records:
+            record.trim_whitespace()
+    with metrics.timer("taxonomy.group"):
+        taxa, indexes = group(records)
+    metrics.count("taxonomy.keys", len(taxa))
+
+    check_distinct(taxa, cache)
+
+    # merge results back into records
+
+    with metrics.timer("taxonomy.merge"):
+        merge(records, taxa, indexes)
@@ -1,53 +1,230 @@
 from isodateparser import ISODateParser
 import datetime
 import logging
+import re
+import numpy
+from obisqc.util import metrics
 from obisqc.util.flags import Flag
+from obisqc.util.cache import LRUCache
 from obisqc.model import Record
-from typing import List
+from typing import Dict, Iterable, List, Tuple
 
 logger = logging.getLogger(__name__)
 
+# interpreted eventDates, shared by all batches in this process
+cache = LRUCache()
+
+# YYYY, YYYY-MM, YYYY-MM-DD or YYYY-MM-DDThh:mm:ss, optionally as a start/end interval
+DATE_PATTERN = r"(\d{4})(?:-(\d{2})(?:-(\d{2})(?:T(\d{2}):(\d{2}):(\d{2}))?)?)?"
+FAST_PATTERN = re.compile(f"{DATE_PATTERN}(?:/{DATE_PATTERN})?")
+MILLIS_PER_DAY = 86400000
+
 
 def date_to_millis(d) -> int:
     """Convert a date to milliseconds."""
     return int((d - datetime.date(1970, 1, 1)).total_seconds() * 1000)
 
 
-def check_record(record: Record, min_year: int = 1582):
+def today_millis() -> int:
+    """Get the current date in milliseconds, dates ending later are in the future."""
+    return date_to_millis(datetime.date.today())
+
+
+def interpret(event_date: str, min_year: int, max_millis: int) -> Tuple:
+    """Interpret an eventDate, returns (start, mid, end, year, flag, invalid)."""
+
+    try:
+        parser = ISODateParser(event_date)
+
+        if parser.dates["start"].year < min_year:
+            # year precedes minimum year in settings
+            return None, None, None, None, Flag.DATE_BEFORE_MIN, True
+
+        ms_start = date_to_millis(parser.dates["start"])
+        ms_mid = date_to_millis(parser.dates["mid"])
+        ms_end = date_to_millis(parser.dates["end"])
+        year = datetime.datetime.fromtimestamp(ms_mid / 1000).year
+
+        if ms_end > max_millis:
+            # date in the future
+            return None, None, None, None, Flag.DATE_IN_FUTURE, True
+
+        return ms_start, ms_mid, ms_end, year, None, False
+
+    except ValueError:
+        return None, None, None, None, None, True
+    except:
+        logger.error("Error processing date " + event_date)
+        raise
+
+
+def month_start(year: numpy.ndarray, month: numpy.ndarray) -> numpy.ndarray:
+    """Get the first day of the month as days since the epoch."""
+    months = numpy.datetime64("1970-01", "M") + ((year - 1970) * 12 + month - 1).astype("timedelta64[M]")
+    return months.astype("datetime64[D]").astype(numpy.int64)
+
+
+def component_days(parts: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """Get the first and last day of a matched date as days since the epoch, and whether the date is valid. Parts has
+    columns year, month, day, hour, minute, second, -1 indicates a missing part."""
+
+    year, month, day, hour, minute, second = parts.T
+    has_month = month >= 0
+    has_day = day >= 0
+    has_time = hour >= 0
+
+    valid = (year >= 1) & (~has_month | ((month >= 1) & (month <= 12)))
+    month = numpy.where(has_month & valid, month, 1)
+    first = month_start(year, month)
+    days_in_month = month_start(year + (month == 12), month % 12 + 1) - first
+    valid &= ~has_day | ((day >= 1) & (day <= days_in_month))
+    valid &= ~has_time | ((hour <= 23) & (minute <= 59) & (second <= 59))
+
+    year_end = month_start(year + 1, numpy.ones_like(month)) - 1
+    start = numpy.where(has_day, first + day - 1, first)
+    end = numpy.where(has_day, start, numpy.where(has_month, first + days_in_month - 1, year_end))
+
+    return start, end, valid
+
+
+def interpret_columns(event_dates: List[str], min_year: int, max_millis: int) -> Dict[str, numpy.ndarray]:
+    """Interpret a column of eventDates. The common ISO 8601 shapes are computed in bulk, other values are interpreted
+    with ISODateParser. Returns date_start, date_mid, date_end and date_year (only meaningful where not invalid),
+    flag, invalid, and fast which indicates values handled in bulk."""
+
+    n = len(event_dates)
+    parts = numpy.full((n, 12), -1, dtype=numpy.int64)
+    matched = numpy.zeros(n, dtype=bool)
+
+    for i, event_date in enumerate(event_dates):
+        m = FAST_PATTERN.fullmatch(event_date) if isinstance(event_date, str) else None
+        if m is not None:
+            parts[i] = [int(group) if group is not None else -1 for group in m.groups()]
+            matched[i] = True
+
+    is_interval = parts[:, 6] >= 0
+    start, start_end, start_valid = component_days(parts[:, 0:6])
+    _, end, end_valid = component_days(parts[:, 6:12])
+    end = numpy.where(is_interval, end, start_end)
+
+    fast = matched & start_valid & (~is_interval | end_valid) & (end >= start)
+    mid = start + (end - start) // 2
+
+    result = {
+        "date_start": start * MILLIS_PER_DAY,
+        "date_mid": mid * MILLIS_PER_DAY,
+        "date_end": end * MILLIS_PER_DAY,
+        "date_year": numpy.zeros(n, dtype=numpy.int64),
+        "flag": numpy.full(n, None, dtype=object),
+        "invalid": numpy.zeros(n, dtype=bool),
+        "fast": fast
+    }
+
+    before_min = fast & (parts[:, 0] < min_year)
+    in_future = fast & ~before_min & (result["date_end"] > max_millis)
+    result["flag"][before_min] = Flag.DATE_BEFORE_MIN
+    result["flag"][in_future] = Flag.DATE_IN_FUTURE
+    result["invalid"] = before_min | in_future
+
+    # the year is derived from the mid date in the same way as in interpret
+
+    ok = fast & ~result["invalid"]
+    if ok.any():
+        mids, inverse = numpy.unique(result["date_mid"][ok], return_inverse=True)
+        years = numpy.array([datetime.datetime.fromtimestamp(ms / 1000).year for ms in mids.tolist()], dtype=numpy.int64)
+        result["date_year"][ok] = years[inverse.reshape(-1)]
+
+    # fall back to ISODateParser
+
+    for i in numpy.flatnonzero(~fast):
+        ms_start, ms_mid, ms_end, year, flag, invalid = interpret(event_dates[i], min_year, max_millis)
+        result["flag"][i] = flag
+        result["invalid"][i] = invalid
+        if not invalid:
+            result["date_start"][i] = ms_start
+            result["date_mid"][i] = ms_mid
+            result["date_end"][i] = ms_end
+            result["date_year"][i] = year
+
+    return result
+
+
+def interpret_cached(event_date: str, min_year: int, max_millis: int) -> Tuple:
+    """Interpret an eventDate using the cache."""
+    key = (event_date, min_year, max_millis)
+    result = cache.get(key)
+    if result is None:
+        result = interpret(event_date, min_year, max_millis)
+        cache.put(key, result)
+    return result
+
+
+def apply(record: Record, result: Tuple) -> None:
+    """Write an interpreted eventDate to a record."""
+    ms_start, ms_mid, ms_end, year, flag, invalid = result
+    if flag is not None:
+        record.set_flag(flag)
+    if invalid:
+        record.set_invalid("eventDate")
+    else:
+        record.set_interpreted("date_start", ms_start)
+        record.set_interpreted("date_mid", ms_mid)
+        record.set_interpreted("date_end", ms_end)
+        record.set_interpreted("date_year", year)
+
+
+def check_record(record: Record, min_year: int = 1582, max_millis: int = None):
     """Check the eventDate."""
 
     if record.get("eventDate") is not None:
-        try:
-            parser = ISODateParser(record.get("eventDate"))
-
-            if parser.dates["start"].year < min_year:
-                # year precedes minimum year in settings
-                record.set_flag(Flag.DATE_BEFORE_MIN)
-                raise ValueError
-
-            ms_start = date_to_millis(parser.dates["start"])
-            ms_mid = date_to_millis(parser.dates["mid"])
-            ms_end = date_to_millis(parser.dates["end"])
-            year = datetime.datetime.fromtimestamp(ms_mid / 1000).year
-
-            if ms_end > date_to_millis(datetime.date.today()):
-                # date in the future
-                record.set_flag(Flag.DATE_IN_FUTURE)
-                raise ValueError
-
-            record.set_interpreted("date_start", ms_start)
-            record.set_interpreted("date_mid", ms_mid)
-            record.set_interpreted("date_end", ms_end)
-            record.set_interpreted("date_year", year)
-
-        except ValueError:
-            record.set_invalid("eventDate")
-        except:
-            logger.error("Error processing date " + record.get("eventDate"))
-            raise
+        if max_millis is None:
+            max_millis = today_millis()
+        apply(record, interpret_cached(record.get("eventDate"), min_year, max_millis))
     else:
         record.set_missing("eventDate")
 
 
+def interpret_distinct(event_dates: Iterable, min_year: int = 1582, max_millis: int = None) -> Dict[str, Tuple]:
+    """Interpret each distinct eventDate once, results are looked up in the cache first and remaining values are
+    interpreted in bulk."""
+
+    if max_millis is None:
+        max_millis = today_millis()
+    results = {}
+    missing = []
+
+    for event_date in dict.fromkeys(event_dates):
+        if event_date is not None:
+            result = cache.get((event_date, min_year, max_millis))
+            if result is None:
+                missing.append(event_date)
+            else:
+                results[event_date] = result
+
+    metrics.count("time.unique", len(results) + len(missing))
+    metrics.count("time.interpreted", len(missing))
+    if len(missing) > 0:
+        columns = interpret_columns(missing, min_year, max_millis)
+        values = zip(*[columns[key].tolist() for key in ["date_start", "date_mid", "date_end", "date_year", "flag", "invalid"]])
+        for event_date, (ms_start, ms_mid, ms_end, year, flag, invalid) in zip(missing, values):
+            if invalid:
+                result = (None, None, None, None, flag, True)
+            else:
+                result = (ms_start, ms_mid, ms_end, year, flag, False)
+            cache.put((event_date, min_year, max_millis), result)
+            results[event_date] = result
+
+    return results
+
+
 def check(records: List[Record], min_year: int = 1582):
-    return [check_record(record, min_year) for record in records]
+    """Check the eventDate for a batch of records, each distinct eventDate is interpreted once."""
+
+    results = interpret_distinct([record.get("eventDate") for record in records], min_year)
+
+    for record in records:
+        event_date = record.get("eventDate")
+        if event_date is not None:
+            apply(record, results[event_date])
+        else:
+            record.set_missing("eventDate")
@@ -1,20 +1,39 @@
-from typing import Dict
+from typing import Dict, List, Tuple
 import pyworms
 import logging
 import requests
 from obisqc.model import AphiaInfo
+from obisqc.util import metrics
 from obisqc.util.flags import Flag
 from obisqc.util.status import Status
+from obisqc.util.names import parse_names
+from obisqc.util.match_cache import open_match_cache
+from obisqc.util.sqlite import query_in
 import re
 from math import ceil
 import sqlite3
 import json
 import os
+import threading
+import datetime
+from pathlib import Path
 
 
 logger = logging.getLogger(__name__)
+
+# annotated list index, loaded on first use
 annotated_list = None
 
+SQLITE_MMAP_SIZE = 1024 * 1024 * 1024
+SQLITE_CACHE_SIZE_KIB = 64 * 1024
+
+# connections are kept per thread, and are tagged with the process ID so forked workers open their own
+connections = threading.local()
+
+# connections inherited from a parent process, referenced here so they are never closed, and so never touched, in a
+# forked child
+inherited_connections = []
+
 
 def parse_scientificnameid(input: str) -> int:
     if not isinstance(input, str):
@@ -33,99 +52,116 @@ def parse_scientificnameid(input: str) -> int:
             return None
 
 
-def get_annotated_list() -> None:
-    global annotated_list
-    response = requests.get("https://api.obis.org/taxon/annotations")
+ANNOTATION_FLAGS = {
+    "black: no biota": Flag.WORMS_ANNOTATION_NO_BIOTA,
+    "black (no biota)": Flag.WORMS_ANNOTATION_NO_BIOTA,
+    "black (unresolvable, looks like a scientific name)": Flag.WORMS_ANNOTATION_UNRESOLVABLE,
+    "black: unresolvable, looks like a scientific name": Flag.WORMS_ANNOTATION_UNRESOLVABLE,
+    "grey/reject habitat": Flag.WORMS_ANNOTATION_REJECT_HABITAT,
+    "grey: reject: habitat": Flag.WORMS_ANNOTATION_REJECT_HABITAT,
+    "grey/reject species grouping": Flag.WORMS_ANNOTATION_REJECT_GROUPING,
+    "grey: reject: species grouping": Flag.WORMS_ANNOTATION_REJECT_GROUPING,
+    "grey/reject ambiguous": Flag.WORMS_ANNOTATION_REJECT_AMBIGUOUS,
+    "grey: reject: ambiguous": Flag.WORMS_ANNOTATION_REJECT_AMBIGUOUS,
+    "grey/reject fossil": Flag.WORMS_ANNOTATION_REJECT_FOSSIL,
+    "grey: reject: fossil": Flag.WORMS_ANNOTATION_REJECT_FOSSIL,
+    "white/typo: resolvable to aphiaid": Flag.WORMS_ANNOTATION_RESOLVABLE_TYPO,
+    "white/exact match, authority included": Flag.WORMS_ANNOTATION_RESOLVABLE_AUTHORITY,
+    "white/unpublished combination: resolvable to aphiaid": Flag.WORMS_ANNOTATION_RESOLVABLE_UNPUBLISHED,
+    "white/human intervention, resolvable to aphiaid": Flag.WORMS_ANNOTATION_RESOLVABLE,
+    "white: human intervention: resolvable to aphiaid": Flag.WORMS_ANNOTATION_RESOLVABLE,
+    "white: human intervention, resolvable to aphiaid": Flag.WORMS_ANNOTATION_RESOLVABLE,
+    "white: human intervention: exact match, authority included": Flag.WORMS_ANNOTATION_RESOLVABLE_AUTHORITY,
+    "white/human intervention, loss of info, resolvable to aphiaid": Flag.WORMS_ANNOTATION_RESOLVABLE_LOSS,
+    "white: human intervention: loss of information, resolvable to aphiaid": Flag.WORMS_ANNOTATION_RESOLVABLE_LOSS,
+    "blue/awaiting editor feedback": Flag.WORMS_ANNOTATION_AWAIT_EDITOR,
+    "blue/awaiting provider feedback": Flag.WORMS_ANNOTATION_AWAIT_PROVIDER,
+    "blue/dmt to process": Flag.WORMS_ANNOTATION_TODO
+}
+ANNOTATION_FIELDS = ["scientificname", "scientificnameid", "phylum", "class", "order", "family", "genus"]
+ANNOTATION_TAXON_FIELDS = ["scientificName", "scientificNameID", "phylum", "class", "order", "family", "genus"]
+ANNOTATED_LIST_URL = "https://api.obis.org/taxon/annotations"
+ANNOTATED_LIST_SNAPSHOT_VERSION = 1
+
+
+def get_annotated_list_path() -> str:
+    """Get the path of the local annotated list snapshot."""
+    return os.getenv("ANNOTATED_LIST_PATH", os.path.join(os.path.expanduser("~"), ".cache", "obisqc", "annotations.json"))
+
+
+def refresh_annotated_list(path: str = None) -> None:
+    """Download the annotated list and store it as a local snapshot."""
+    path = path or get_annotated_list_path()
+    response = requests.get(ANNOTATED_LIST_URL)
     if response.status_code == 200:
         data = response.json()
         if "results" in data and len(data["results"]) > 0:
-            annotated_list = dict()
-            for entry in data["results"]:
-                if entry["scientificname"] not in annotated_list:
-                    annotated_list[entry["scientificname"]] = list()
-                annotated_list[entry["scientificname"]].append(entry)
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            snapshot = {
+                "version": ANNOTATED_LIST_SNAPSHOT_VERSION,
+                "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "results": data["results"]
+            }
+            with open(path + ".tmp", "w") as f:
+                json.dump(snapshot, f)
+            os.replace(path + ".tmp", path)
             logger.debug("Fetched annotated list with %s names" % (len(data["results"])))
             return
     raise RuntimeError("Cannot access annotated list")
 
 
+def index_annotated_list(entries: List[Dict]) -> Dict[Tuple, Dict]:
+    """Index annotated list entries by name, identifier and classification, keeping the first entry for each key."""
+    index = dict()
+    for entry in entries:
+        key = tuple(entry[field] for field in ANNOTATION_FIELDS)
+        if key not in index:
+            annotation_type = entry["annotation_type"].lower()
+            index[key] = {
+                "aphiaid": int(entry["annotation_resolved_aphiaid"]) if entry["annotation_resolved_aphiaid"] is not None else None,
+                "annotation_type": annotation_type,
+                "flag": ANNOTATION_FLAGS.get(annotation_type)
+            }
+    return index
+
+
+def get_annotated_list(refresh: bool = False) -> Dict[Tuple, Dict]:
+    """Load the annotated list from the local snapshot, the snapshot is downloaded if missing, outdated or if refresh is set."""
+    global annotated_list
+    if annotated_list is None or refresh:
+        path = get_annotated_list_path()
+        snapshot = None
+        if not refresh and os.path.exists(path):
+            with open(path) as f:
+                snapshot = json.load(f)
+        if snapshot is None or snapshot.get("version") != ANNOTATED_LIST_SNAPSHOT_VERSION:
+            refresh_annotated_list(path)
+            with open(path) as f:
+                snapshot = json.load(f)
+        annotated_list = index_annotated_list(snapshot["results"])
+        logger.debug("Loaded annotated list snapshot from %s" % (snapshot.get("created")))
+    return annotated_list
+
+
 def check_annotated_list(taxa):
     logger.info("Checking annotated list")
 
+    index = None
+
     for key, taxon in taxa.items():
         if taxon.get("scientificName") is not None and taxon.aphiaid is None:
 
-            if taxon.get("scientificName") in annotated_list:
-                possible_matches = annotated_list[taxon.get("scientificName")]
-
-                for possible_match in possible_matches:
-                    if (
-                        possible_match["scientificnameid"] == taxon.get("scientificNameID") and
-                        possible_match["phylum"] == taxon.get("phylum") and
-                        possible_match["class"] == taxon.get("class") and
-                        possible_match["order"] == taxon.get("order") and
-                        possible_match["family"] == taxon.get("family") and
-                        possible_match["genus"] == taxon.get("genus")
-                    ):
-
-                        if possible_match["annotation_resolved_aphiaid"] is not None:
-                            if possible_match["annotation_resolved_aphiaid"] is not None:
-                                taxon.aphiaid = int(possible_match["annotation_resolved_aphiaid"])
-                            logger.debug("Matched name %s using annotated list" % (taxon.get("scientificName")))
-
-                        annotation_type = possible_match["annotation_type"].lower()
-                        if annotation_type == "black: no biota":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_NO_BIOTA)
-                        elif annotation_type == "black (no biota)":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_NO_BIOTA)
-                        elif annotation_type == "black (unresolvable, looks like a scientific name)":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_UNRESOLVABLE)
-                        elif annotation_type == "black: unresolvable, looks like a scientific name":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_UNRESOLVABLE)
-                        elif annotation_type == "grey/reject habitat":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_REJECT_HABITAT)
-                        elif annotation_type == "grey: reject: habitat":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_REJECT_HABITAT)
-                        elif annotation_type == "grey/reject species grouping":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_REJECT_GROUPING)
-                        elif annotation_type == "grey: reject: species grouping":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_REJECT_GROUPING)
-                        elif annotation_type == "grey/reject ambiguous":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_REJECT_AMBIGUOUS)
-                        elif annotation_type == "grey: reject: ambiguous":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_REJECT_AMBIGUOUS)
-                        elif annotation_type == "grey/reject fossil":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_REJECT_FOSSIL)
-                        elif annotation_type == "grey: reject: fossil":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_REJECT_FOSSIL)
-                        elif annotation_type == "white/typo: resolvable to aphiaid":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_RESOLVABLE_TYPO)
-                        elif annotation_type == "white/exact match, authority included":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_RESOLVABLE_AUTHORITY)
-                        elif annotation_type == "white/unpublished combination: resolvable to aphiaid":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_RESOLVABLE_UNPUBLISHED)
-                        elif annotation_type == "white/human intervention, resolvable to aphiaid":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_RESOLVABLE)
-                        elif annotation_type == "white: human intervention: resolvable to aphiaid":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_RESOLVABLE)
-                        elif annotation_type == "white: human intervention, resolvable to aphiaid":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_RESOLVABLE)
-                        elif annotation_type == "white: human intervention: exact match, authority included":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_RESOLVABLE_AUTHORITY)
-                        elif annotation_type == "white/human intervention, loss of info, resolvable to aphiaid":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_RESOLVABLE_LOSS)
-                        elif annotation_type == "white: human intervention: loss of information, resolvable to aphiaid":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_RESOLVABLE_LOSS)
-                        elif annotation_type == "blue/awaiting editor feedback":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_AWAIT_EDITOR)
-                        elif annotation_type == "blue/awaiting provider feedback":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_AWAIT_PROVIDER)
-                        elif annotation_type == "blue/dmt to process":
-                            taxon.set_flag(Flag.WORMS_ANNOTATION_TODO)
-                        else:
-                            raise RuntimeError("Unknown annotation %s" % (annotation_type))
-
-                        break
+            if index is None:
+                index = get_annotated_list()
+
+            annotation = index.get(tuple(taxon.get(field) for field in ANNOTATION_TAXON_FIELDS))
+            if annotation is not None:
+                if annotation["aphiaid"] is not None:
+                    taxon.aphiaid = annotation["aphiaid"]
+                    logger.debug("Matched name %s using annotated list" % (taxon.get("scientificName")))
+                if annotation["flag"] is None:
+                    raise RuntimeError("Unknown annotation %s" % (annotation["annotation_type"]))
+                taxon.set_flag(annotation["flag"])
 
 
 def sanitize_name(name: str) -> str:
@@ -142,36 +178,60 @@ def chunk_into_n(lst, n):
     return list(map(lambda x: lst[x * size:x * size + size], list(range(n))))
 
 
-def match_with_sqlite(names: list[str]):
-    import gnparser
+def open_connection(path: str) -> sqlite3.Connection:
+    """Open the WoRMS database read only and tune it for lookups."""
+    uri = Path(path).resolve().as_uri() + "?mode=ro"
+    con = sqlite3.connect(uri, uri=True, cached_statements=256)
+    con.row_factory = sqlite3.Row
+    con.execute(f"pragma mmap_size = {SQLITE_MMAP_SIZE}")
+    con.execute(f"pragma cache_size = {-SQLITE_CACHE_SIZE_KIB}")
+    con.execute("pragma query_only = 1")
+    return con
+
+
+def get_connection() -> sqlite3.Connection:
+    """Get the WoRMS database connection for the current process and thread, the connection is opened on first use."""
+    path = os.getenv("WORMS_DB_PATH")
+    if path is None:
+        raise RuntimeError("WORMS_DB_PATH is not set")
+    pid = os.getpid()
+    if getattr(connections, "pid", None) != pid or connections.path != path:
+        if getattr(connections, "con", None) is not None:
+            if connections.pid != pid:
+                inherited_connections.append(connections.con)
+            else:
+                connections.con.close()
+        connections.pid = pid
+        connections.path = path
+        connections.con = open_connection(path)
+    return connections.con
+
+
+def close_connection() -> None:
+    """Close the WoRMS database connection for the current thread."""
+    if getattr(connections, "con", None) is not None:
+        if connections.pid == os.getpid():
+            connections.con.close()
+        else:
+            inherited_connections.append(connections.con)
+    connections.pid = None
+    connections.path = None
+    connections.con = None
 
+
+def match_with_sqlite(names: list[str]):
     logger.info(f"Matching names against sqlite {os.getenv('WORMS_DB_PATH')}")
 
     # get all canonical names and authorships
 
-    parsed_names = []
-
-    for name in names:
-        parsed_str = gnparser.parse_to_string(name, "compact", None, 1, 1)
-        parsed = json.loads(parsed_str)
-        if parsed.get("parsed"):
-            canonical = parsed.get("canonical", None).get("full", None)
-            authorship = parsed.get("authorship", {}).get("normalized", None)
-            parsed_names.append((canonical, authorship))
-        else:
-            parsed_names.append((None, None))
+    parsed_names = parse_names(names)
 
     # fetch all matches by canonical name
 
-    con = sqlite3.connect(os.getenv("WORMS_DB_PATH"))
-    con.row_factory = sqlite3.Row
-    cur = con.cursor()
+    cur = get_connection().cursor()
 
     canonicals = list(set([name[0] for name in parsed_names if name[0] is not None]))
-    placeholders = ",".join("?" * len(canonicals))
-    
-    cur.execute(f"select * from parsed where canonical in ({placeholders})", canonicals)
-    matches = cur.fetchall()
+    matches = query_in(cur, "select aphiaid, canonical, authorship, valid_aphiaid from parsed where canonical in ({placeholders})", canonicals)
     canonicals_map = {}
     for row in matches:
         canonical = row["canonical"]
@@ -184,8 +244,6 @@ def match_with_sqlite(names: list[str]):
             "valid_aphiaid": row["valid_aphiaid"]
         })
 
-    con.close()
-
     # get all matches by canonical name and authorship
 
     results = []
@@ -207,6 +265,29 @@ def match_with_sqlite(names: list[str]):
     return results
 
 
+def match_names(names: list[str]):
+    """Match names against the WoRMS database, using the persistent matching cache if configured."""
+
+    cache = open_match_cache()
+    if cache is None:
+        return match_with_sqlite(names)
+
+    try:
+        results = cache.get_many(names)
+        missing = [name for name in dict.fromkeys(names) if name not in results]
+        metrics.count("match_cache.hits", len(results))
+        metrics.count("match_cache.misses", len(missing))
+        logger.debug("Found %s of %s names in matching cache" % (len(results), len(results) + len(missing)))
+        if len(missing) > 0:
+            new_results = dict(zip(missing, match_with_sqlite(missing)))
+            cache.put_many(new_results)
+            results.update(new_results)
+    finally:
+        cache.close()
+
+    return [results[name] for name in names]
+
+
 def match_worms(taxa: Dict[str, AphiaInfo]):
     """Try to match any records that have a scientificName but no LSID."""
 
@@ -229,7 +310,7 @@ def match_worms(taxa: Dict[str, AphiaInfo]):
 
     if len(names) > 0:
 
-        matches = match_with_sqlite(names)
+        matches = match_names(names)
 
         assert (len(matches) == len(names))
         for i in range(0, len(matches)):
@@ -262,25 +343,36 @@ def convert_environment(env: int):
         return bool(env)
 
 
+def parse_aphia_row(row: sqlite3.Row) -> Dict:
+    """Convert a row from the parsed table to an Aphia info dict."""
+    return {
+        "record": json.loads(row["record"]),
+        "bold_id": row["bold_id"],
+        "ncbi_id": row["ncbi_id"]
+    }
+
+
+def fetch_aphia_bulk(cur: sqlite3.Cursor, aphiaids) -> Dict[int, Dict]:
+    """Fetch the Aphia records for a collection of AphiaIDs using chunked queries, keyed by integer AphiaID."""
+
+    results = {}
+    rows = query_in(cur, "select aphiaid, record, bold_id, ncbi_id from parsed where aphiaid in ({placeholders})", list(set(aphiaids)))
+
+    for row in rows:
+        aphiaid = int(row["aphiaid"])
+        if aphiaid not in results:
+            aphia_info = parse_aphia_row(row)
+            if aphia_info["record"] is not None:
+                results[aphiaid] = aphia_info
+
+    return results
+
+
 def fetch_aphia(aphiaid):
     """Fetch the Aphia record an AphiaID."""
 
-    con = sqlite3.connect(os.getenv("WORMS_DB_PATH"))
-    con.row_factory = sqlite3.Row
-    cur = con.cursor()
-    cur.execute("select * from parsed where aphiaid = ?", (aphiaid,))
-    res = cur.fetchone()
-    con.close()
-    if res is None:
-        return {"record": None}
-    record = json.loads(res["record"])
-
-    aphia_info = {
-        "record": record,
-        "bold_id": res["bold_id"],
-        "ncbi_id": res["ncbi_id"]
-    }
-    return aphia_info
+    results = fetch_aphia_bulk(get_connection().cursor(), [aphiaid])
+    return next(iter(results.values()), {"record": None})
 
 
 def detect_lsid(taxa: Dict[str, AphiaInfo]) -> None:
@@ -319,25 +411,26 @@ def detect_external(taxa: Dict[str, AphiaInfo]) -> None:
 def fetch(taxa):
     """Fetch Aphia info from WoRMS, including alternative."""
 
-    for key, taxon in taxa.items():
+    aphiaids = set([taxon.aphiaid for taxon in taxa.values() if taxon.aphiaid is not None])
+    if len(aphiaids) == 0:
+        return
 
-        # TODO: fetch all aphia info records including alternatives in one go
+    cur = get_connection().cursor()
 
-        if taxon.aphiaid is not None:
-            aphia_info = fetch_aphia(taxon.aphiaid)
-            if aphia_info["record"] is None:
-                pass
-            else:
-                taxon.aphia_info = aphia_info
-                if has_alternative(aphia_info):
+    # fetch all Aphia records, followed by the alternatives which have not been fetched yet
 
-                    # alternative provided
+    aphia_infos = fetch_aphia_bulk(cur, aphiaids)
+    alternatives = set([aphia_info["record"]["valid_AphiaID"] for aphia_info in aphia_infos.values() if has_alternative(aphia_info)])
+    aphia_infos.update(fetch_aphia_bulk(cur, alternatives - aphia_infos.keys()))
+
+    for key, taxon in taxa.items():
+        if taxon.aphiaid is not None and taxon.aphiaid in aphia_infos:
+            taxon.aphia_info = aphia_infos[taxon.aphiaid]
+            if has_alternative(taxon.aphia_info):
 
-                    aphia_info_accepted = fetch_aphia(taxon.aphia_info["record"]["valid_AphiaID"])
-                    if aphia_info_accepted["record"] is None:
-                        pass
-                    else:
-                        taxon.aphia_info_accepted = aphia_info_accepted
+                # alternative provided
 
+                valid_aphiaid = taxon.aphia_info["record"]["valid_AphiaID"]
+                if valid_aphiaid in aphia_infos:
+                    taxon.aphia_info_accepted = aphia_infos[valid_aphiaid]
 
-get_annotated_list()
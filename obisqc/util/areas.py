@@ -0,0 +1,179 @@
+from typing import Dict, List, Sequence, Tuple
+import glob
+import json
+import logging
+import os
+import numpy
+
+
+logger = logging.getLogger(__name__)
+
+# maximum number of point and edge combinations tested at once
+BLOCK_SIZE = 1000000
+
+# target number of edges per horizontal band of a polygon
+BAND_EDGES = 32
+
+
+def polygon_edges(rings: List) -> numpy.ndarray:
+    """Get all edges of a polygon and its holes as an array of x0, y0, x1, y1 rows."""
+    edges = []
+    for ring in rings:
+        ring = numpy.asarray(ring, dtype=float)[:, :2]
+        if len(ring) > 1:
+            edges.append(numpy.hstack([ring[:-1], ring[1:]]))
+    return numpy.vstack(edges) if len(edges) > 0 else numpy.empty((0, 4))
+
+
+def crossings(edges: numpy.ndarray, x: numpy.ndarray, y: numpy.ndarray) -> numpy.ndarray:
+    """Even-odd point in polygon test of points against a set of edges, in blocks of at most BLOCK_SIZE tests."""
+    inside = numpy.zeros(len(x), dtype=bool)
+    step = max(1, BLOCK_SIZE // max(len(x), 1))
+    for i in range(0, len(edges), step):
+        x0, y0, x1, y1 = (column[:, None] for column in edges[i:i + step].T)
+        crosses = (y0 > y) != (y1 > y)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            intersect = (x1 - x0) * (y - y0) / (y1 - y0) + x0
+        inside ^= numpy.logical_xor.reduce(crosses & (x < intersect), axis=0)
+    return inside
+
+
+def contains(edges: numpy.ndarray, x: numpy.ndarray, y: numpy.ndarray) -> numpy.ndarray:
+    """Point in polygon test. For polygons with many edges, edges and points are split in horizontal bands so points
+    are only tested against the edges spanning their band."""
+    nbands = min(len(edges) // BAND_EDGES, len(x))
+    if nbands < 2:
+        return crossings(edges, x, y)
+    ymin = min(edges[:, 1].min(), edges[:, 3].min())
+    height = (max(edges[:, 1].max(), edges[:, 3].max()) - ymin) / nbands
+    if height == 0:
+        return crossings(edges, x, y)
+
+    def band(values):
+        return numpy.clip(((values - ymin) / height).astype(numpy.intp), 0, nbands - 1)
+
+    edge_low = band(numpy.minimum(edges[:, 1], edges[:, 3]))
+    edge_high = band(numpy.maximum(edges[:, 1], edges[:, 3]))
+    point_band = band(y)
+    inside = numpy.zeros(len(x), dtype=bool)
+    for b in numpy.unique(point_band).tolist():
+        points = point_band == b
+        selected = edges[(edge_low <= b) & (edge_high >= b)]
+        inside[points] = crossings(selected, x[points], y[points])
+    return inside
+
+
+class AreaIndex:
+    """Point in polygon index over area layers, with polygon bounding boxes registered in a uniform grid of cells."""
+
+    def __init__(self, cell_size: float = 1.0):
+        self.cell_size = cell_size
+        self.ncol = int(numpy.ceil(360 / cell_size))
+        self.nrow = int(numpy.ceil(180 / cell_size))
+        self.features: List[Tuple[str, Dict]] = []
+        self.polygons: List[numpy.ndarray] = []
+        self.polygon_features: List[int] = []
+        self.bounds = numpy.empty((0, 4))
+        self.cell_offsets = numpy.zeros(self.nrow * self.ncol + 1, dtype=numpy.intp)
+        self.cell_polygons = numpy.empty(0, dtype=numpy.intp)
+
+    @classmethod
+    def load(cls, path: str, cell_size: float = 1.0) -> "AreaIndex":
+        """Load all GeoJSON files in a directory, each file is an area layer named after the file."""
+        index = cls(cell_size)
+        for file in sorted(glob.glob(os.path.join(path, "*.geojson"))):
+            with open(file) as f:
+                index.add_layer(os.path.splitext(os.path.basename(file))[0], json.load(f))
+        index.build()
+        logger.debug(f"Loaded {len(index.features)} areas from {path}")
+        return index
+
+    def add_layer(self, layer: str, collection: Dict) -> None:
+        """Add the polygons of a GeoJSON feature collection, features are identified by their id and name properties."""
+        for feature in collection["features"]:
+            geometry = feature.get("geometry")
+            if geometry is None:
+                continue
+            if geometry["type"] == "Polygon":
+                parts = [geometry["coordinates"]]
+            elif geometry["type"] == "MultiPolygon":
+                parts = geometry["coordinates"]
+            else:
+                continue
+            properties = feature.get("properties") or {}
+            self.features.append((layer, {"id": properties.get("id", feature.get("id")), "name": properties.get("name")}))
+            for rings in parts:
+                edges = polygon_edges(rings)
+                if len(edges) > 0:
+                    self.polygons.append(edges)
+                    self.polygon_features.append(len(self.features) - 1)
+
+    def cell_range(self, lon: numpy.ndarray, lat: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        col = numpy.clip(((numpy.asarray(lon) + 180) / self.cell_size).astype(numpy.intp), 0, self.ncol - 1)
+        row = numpy.clip(((numpy.asarray(lat) + 90) / self.cell_size).astype(numpy.intp), 0, self.nrow - 1)
+        return row, col
+
+    def build(self) -> None:
+        """Register polygon bounding boxes in the grid cells they overlap."""
+        self.bounds = numpy.array([[
+            min(edges[:, 0].min(), edges[:, 2].min()),
+            min(edges[:, 1].min(), edges[:, 3].min()),
+            max(edges[:, 0].max(), edges[:, 2].max()),
+            max(edges[:, 1].max(), edges[:, 3].max())
+        ] for edges in self.polygons]).reshape(-1, 4)
+        row_min, col_min = self.cell_range(self.bounds[:, 0], self.bounds[:, 1])
+        row_max, col_max = self.cell_range(self.bounds[:, 2], self.bounds[:, 3])
+        cells = []
+        polygons = []
+        for i in range(len(self.polygons)):
+            rows, cols = numpy.mgrid[row_min[i]:row_max[i] + 1, col_min[i]:col_max[i] + 1]
+            cells.append((rows * self.ncol + cols).ravel())
+            polygons.append(numpy.full(rows.size, i, dtype=numpy.intp))
+        cells = numpy.concatenate(cells) if len(cells) > 0 else numpy.empty(0, dtype=numpy.intp)
+        polygons = numpy.concatenate(polygons) if len(polygons) > 0 else numpy.empty(0, dtype=numpy.intp)
+        order = numpy.argsort(cells, kind="stable")
+        self.cell_polygons = polygons[order]
+        self.cell_offsets = numpy.searchsorted(cells[order], numpy.arange(self.nrow * self.ncol + 1)).astype(numpy.intp)
+
+    def query_indices(self, lon: Sequence, lat: Sequence) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """Find all point and feature pairs where the point falls within the feature, as two index arrays."""
+        lon = numpy.asarray(lon, dtype=float)
+        lat = numpy.asarray(lat, dtype=float)
+        row, col = self.cell_range(lon, lat)
+        cell = row * self.ncol + col
+
+        # candidate pairs from the grid cells, prefiltered on polygon bounding boxes
+
+        starts = self.cell_offsets[cell]
+        counts = self.cell_offsets[cell + 1] - starts
+        points = numpy.repeat(numpy.arange(len(lon)), counts)
+        offsets = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        polygons = self.cell_polygons[numpy.repeat(starts, counts) + offsets]
+        bounds = self.bounds[polygons]
+        within = (lon[points] >= bounds[:, 0]) & (lon[points] <= bounds[:, 2]) & (lat[points] >= bounds[:, 1]) & (lat[points] <= bounds[:, 3])
+        points = points[within]
+        polygons = polygons[within]
+
+        # exact tests, grouped by polygon
+
+        order = numpy.argsort(polygons, kind="stable")
+        points = points[order]
+        polygons = polygons[order]
+        inside = numpy.zeros(len(points), dtype=bool)
+        boundaries = numpy.flatnonzero(numpy.diff(polygons)) + 1
+        for start, end in zip(numpy.concatenate([[0], boundaries]), numpy.concatenate([boundaries, [len(points)]])):
+            if end > start:
+                selected = points[start:end]
+                inside[start:end] = contains(self.polygons[polygons[start]], lon[selected], lat[selected])
+
+        features = numpy.asarray(self.polygon_features, dtype=numpy.intp)[polygons[inside]]
+        pairs = numpy.unique(numpy.column_stack([points[inside], features]).reshape(-1, 2), axis=0)
+        return pairs[:, 0], pairs[:, 1]
+
+    def query(self, lon: Sequence, lat: Sequence) -> List[Dict[str, List[Dict]]]:
+        """Get the areas for each point, shaped like the areas section of xylookup results."""
+        results = [{} for _ in range(len(lon))]
+        for point, feature in zip(*(column.tolist() for column in self.query_indices(lon, lat))):
+            layer, area = self.features[feature]
+            results[point].setdefault(layer, []).append(area)
+        return results
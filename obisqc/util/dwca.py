@@ -0,0 +1,212 @@
+from typing import Dict, IO, Iterator, List, Tuple
+import csv
+import io
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import zipfile
+import xmltodict
+from obisqc.model import Record
+from obisqc.util import metrics
+from obisqc.util.sqlite import query_in
+
+
+logger = logging.getLogger(__name__)
+
+# keys used in Record.extensions for common row types, other row types use the lowercase last part of the URI
+ROW_TYPES = {
+    "http://rs.tdwg.org/dwc/terms/Occurrence": "occurrence",
+    "http://rs.tdwg.org/dwc/terms/Event": "event",
+    "http://rs.tdwg.org/dwc/terms/MeasurementOrFact": "mof",
+    "http://rs.iobis.org/obis/terms/ExtendedMeasurementOrFact": "emof",
+    "http://rs.gbif.org/terms/1.0/DNADerivedData": "dna"
+}
+
+# number of rows inserted in the extension index at once
+INSERT_SIZE = 10000
+
+# largest field read from an archive, text values such as dynamicProperties can exceed the csv module default
+FIELD_SIZE_LIMIT = 2 ** 31 - 1
+
+
+def unescape(value: str) -> str:
+    """Convert escape sequences as used in meta.xml attributes, such as \\t, to characters."""
+    if value is None:
+        return None
+    return value.replace("\\t", "\t").replace("\\n", "\n").replace("\\r", "\r")
+
+
+def as_list(value) -> List:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def term_name(term: str) -> str:
+    return term.rstrip("/").split("/")[-1].split("#")[-1]
+
+
+class ArchiveFile:
+    """A core or extension file as described in meta.xml."""
+
+    def __init__(self, element: Dict, core: bool):
+        self.core = core
+        self.row_type = element["@rowType"]
+        self.name = ROW_TYPES.get(self.row_type, term_name(self.row_type).lower())
+        self.location = as_list(element["files"]["location"])[0]
+        self.encoding = element.get("@encoding", "UTF-8")
+        self.fields_terminated_by = unescape(element.get("@fieldsTerminatedBy", ","))
+        self.fields_enclosed_by = unescape(element.get("@fieldsEnclosedBy", '"'))
+        self.ignore_header_lines = int(element.get("@ignoreHeaderLines", 0))
+        id_element = element.get("id" if core else "coreid")
+        self.id_index = int(id_element["@index"]) if id_element is not None and id_element.get("@index") is not None else None
+        self.fields: List[Tuple[int, str]] = []
+        self.defaults: Dict[str, str] = {}
+        for field in as_list(element.get("field")):
+            name = term_name(field["@term"])
+            if field.get("@index") is not None:
+                self.fields.append((int(field["@index"]), name))
+            elif field.get("@default") is not None:
+                self.defaults[name] = field["@default"]
+
+
+def parse_meta(content) -> Tuple[ArchiveFile, List[ArchiveFile]]:
+    """Parse meta.xml into the core file and the extension files."""
+    document = xmltodict.parse(content)
+    archive = document["archive"]
+    if archive.get("core") is None:
+        raise RuntimeError("meta.xml does not describe a core file")
+    core = ArchiveFile(archive["core"], core=True)
+    extensions = [ArchiveFile(element, core=False) for element in as_list(archive.get("extension"))]
+    return core, extensions
+
+
+class Archive:
+    """Streaming reader for a Darwin Core Archive, either a zip file or an unpacked directory. Core rows are read in
+    chunks and extension rows are attached by core id, using an on-disk SQLite index of the extension files so memory
+    use does not depend on the size of the archive. Use as a context manager or call close()."""
+
+    def __init__(self, path: str, index_path: str = None):
+        self.path = path
+        self.zip = None if os.path.isdir(path) else zipfile.ZipFile(path)
+        with self.open_member("meta.xml") as f:
+            self.core, self.extensions = parse_meta(f.read())
+        self.index_path = index_path
+        self.index: sqlite3.Connection = None
+        self.tempfile = None
+        # the limit is global to the csv module, so it is raised once here and not restored, as rows are read lazily
+        # and restoring it from a generator would affect readers in between
+        if csv.field_size_limit() < FIELD_SIZE_LIMIT:
+            csv.field_size_limit(FIELD_SIZE_LIMIT)
+
+    def __enter__(self) -> "Archive":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def open_member(self, name: str) -> IO[bytes]:
+        if self.zip is None:
+            return open(os.path.join(self.path, name), "rb")
+        try:
+            return self.zip.open(name)
+        except KeyError:
+            raise RuntimeError(f"{name} not found in {self.path}")
+
+    def rows(self, file: ArchiveFile) -> Iterator[Tuple[str, Dict[str, str]]]:
+        """Stream the rows of a file as id and data tuples, empty values are left out. Lines are split on any newline
+        convention, so linesTerminatedBy is not used."""
+        quoting = csv.QUOTE_MINIMAL if file.fields_enclosed_by else csv.QUOTE_NONE
+        with self.open_member(file.location) as f:
+            text = io.TextIOWrapper(f, encoding=file.encoding, newline="")
+            reader = csv.reader(text, delimiter=file.fields_terminated_by, quotechar=file.fields_enclosed_by or None, quoting=quoting)
+            for _ in range(file.ignore_header_lines):
+                next(reader, None)
+            for row in reader:
+                if len(row) == 0:
+                    continue
+                data = dict(file.defaults)
+                for index, name in file.fields:
+                    if index < len(row) and row[index] != "":
+                        data[name] = row[index]
+                row_id = row[file.id_index] if file.id_index is not None and file.id_index < len(row) else None
+                yield row_id, data
+
+    def build_index(self) -> None:
+        """Write all extension rows to an SQLite database indexed on core id."""
+        if self.index is not None:
+            return
+        path = self.index_path
+        if path is None:
+            fd, path = tempfile.mkstemp(suffix=".db")
+            os.close(fd)
+            self.tempfile = path
+        self.index = sqlite3.connect(path)
+        self.index.execute("pragma journal_mode = off")
+        self.index.execute("pragma synchronous = off")
+        self.index.execute("drop table if exists extension")
+        self.index.execute("create table extension (name text, coreid text, data text)")
+        with metrics.timer("dwca.index"):
+            for file in self.extensions:
+                logger.info(f"Indexing {file.location}")
+                rows = ((file.name, row_id, json.dumps(data)) for row_id, data in self.rows(file))
+                while True:
+                    batch = [row for _, row in zip(range(INSERT_SIZE), rows)]
+                    if len(batch) == 0:
+                        break
+                    self.index.executemany("insert into extension values (?, ?, ?)", batch)
+                    metrics.count("dwca.extension_rows", len(batch))
+            self.index.execute("create index extension_coreid on extension (coreid)")
+            self.index.commit()
+
+    def lookup(self, ids: List[str]) -> Dict[str, Dict[str, List[Record]]]:
+        """Get the extension rows for a list of core ids, in file order."""
+        results: Dict[str, Dict[str, List[Record]]] = {}
+        rows = query_in(self.index.cursor(), "select name, coreid, data from extension where coreid in ({placeholders}) order by rowid", list(set(ids)))
+        for name, coreid, data in rows:
+            record = Record(data=json.loads(data))
+            record.type = name
+            results.setdefault(coreid, {}).setdefault(name, []).append(record)
+        return results
+
+    def chunks(self, chunk_size: int = 10000) -> Iterator[List[Record]]:
+        """Iterate over the core records in chunks, with extension rows attached in Record.extensions and the core id
+        in Record.extras["id"]."""
+        if len(self.extensions) > 0:
+            self.build_index()
+        rows = self.rows(self.core)
+        while True:
+            chunk = [row for _, row in zip(range(chunk_size), rows)]
+            if len(chunk) == 0:
+                return
+            records = []
+            for row_id, data in chunk:
+                record = Record(data=data)
+                record.type = self.core.name
+                if row_id is not None:
+                    record.extras["id"] = row_id
+                records.append(record)
+            metrics.count("dwca.core_rows", len(records))
+            if self.index is not None:
+                extensions = self.lookup([row_id for row_id, _ in chunk if row_id is not None])
+                for (row_id, _), record in zip(chunk, records):
+                    if row_id in extensions:
+                        record.extensions = extensions[row_id]
+            yield records
+
+    def __iter__(self) -> Iterator[Record]:
+        for chunk in self.chunks():
+            yield from chunk
+
+    def close(self) -> None:
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+        if self.tempfile is not None:
+            os.remove(self.tempfile)
+            self.tempfile = None
+        if self.zip is not None:
+            self.zip.close()
+            self.zip = None
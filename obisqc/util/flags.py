@@ -33,3 +33,78 @@ class Flag(Enum):
     WORMS_ANNOTATION_AWAIT_EDITOR = "WORMS_ANNOTATION_AWAIT_EDITOR"
     WORMS_ANNOTATION_AWAIT_PROVIDER = "WORMS_ANNOTATION_AWAIT_PROVIDER"
     WORMS_ANNOTATION_TODO = "WORMS_ANNOTATION_TODO"
+
+
+FLAGS = list(Flag)
+FLAG_BITS = {flag: 1 << i for i, flag in enumerate(FLAGS)}
+
+
+class FlagSet:
+    """Set of flags stored as an integer bitmask, iterates as Flag members in definition order."""
+
+    __slots__ = ("mask",)
+
+    def __init__(self, flags=None, mask: int = 0):
+        self.mask = mask
+        if flags is not None:
+            self.update(flags)
+
+    def add(self, flag: Flag) -> None:
+        self.mask |= FLAG_BITS[flag]
+
+    def discard(self, flag: Flag) -> None:
+        self.mask &= ~FLAG_BITS[flag]
+
+    def update(self, flags) -> None:
+        if isinstance(flags, FlagSet):
+            self.mask |= flags.mask
+        else:
+            for flag in flags:
+                self.mask |= FLAG_BITS[flag]
+
+    # list compatible aliases
+
+    append = add
+    extend = update
+
+    def __contains__(self, flag) -> bool:
+        return flag in FLAG_BITS and self.mask & FLAG_BITS[flag] != 0
+
+    def __iter__(self):
+        mask = self.mask
+        for flag in FLAGS:
+            if mask & FLAG_BITS[flag]:
+                yield flag
+
+    def __len__(self) -> int:
+        return bin(self.mask).count("1")
+
+    def __bool__(self) -> bool:
+        return self.mask != 0
+
+    def __int__(self) -> int:
+        return self.mask
+
+    def __or__(self, other):
+        return FlagSet(mask=self.mask | FlagSet(other).mask)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, FlagSet):
+            return self.mask == other.mask
+        try:
+            return self.mask == FlagSet(other).mask
+        except (KeyError, TypeError):
+            return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "FlagSet([%s])" % ", ".join(flag.value for flag in self)
+
+
+def add_flags(records, flags: FlagSet) -> None:
+    """OR a set of flags into the flags of many records."""
+    mask = flags.mask
+    if mask:
+        for record in records:
+            record.flags.mask |= mask
@@ -0,0 +1,89 @@
+from typing import Dict, List, Sequence
+import logging
+import os
+import numpy
+from obisqc.util.areas import AreaIndex
+
+
+logger = logging.getLogger(__name__)
+
+# grids sampled by the local provider, stored as name.npy in the grids directory
+GRIDS = ["bathymetry", "sstemperature", "sssalinity"]
+SHOREDISTANCE = "shoredistance"
+
+
+def grid_indices(grid: numpy.ndarray, lon: numpy.ndarray, lat: numpy.ndarray):
+    """Get row and column indices for a global grid covering -180 to 180 and 90 to -90, with the first row at the north."""
+    nrow, ncol = grid.shape
+    col = ((lon + 180) * (ncol / 360)).astype(numpy.intp)
+    row = ((90 - lat) * (nrow / 180)).astype(numpy.intp)
+    numpy.clip(col, 0, ncol - 1, out=col)
+    numpy.clip(row, 0, nrow - 1, out=row)
+    return row, col
+
+
+class LocalXYLookup:
+    """Offline replacement for the xylookup service, sampling memory-mapped global rasters. The grids directory holds a
+    2D NumPy array per variable (bathymetry.npy, sstemperature.npy, sssalinity.npy and shoredistance.npy), with missing
+    values as NaN. Areas are looked up in the GeoJSON layers in areas_path, if provided."""
+
+    def __init__(self, path: str = None, areas_path: str = None, areas: AreaIndex = None):
+        self.path = path
+        self.areas = AreaIndex.load(areas_path) if areas is None and areas_path is not None else areas
+        self.open_grids()
+
+    def open_grids(self) -> None:
+        self.grids = {}
+        if self.path is None:
+            return
+        for name in GRIDS + [SHOREDISTANCE]:
+            file = os.path.join(self.path, f"{name}.npy")
+            if os.path.exists(file):
+                grid = numpy.load(file, mmap_mode="r")
+                if grid.ndim != 2:
+                    raise RuntimeError(f"Grid {file} should have two dimensions")
+                self.grids[name] = grid
+        if len(self.grids) == 0:
+            raise RuntimeError(f"No grids found in {self.path}")
+        logger.debug(f"Loaded grids {list(self.grids)} from {self.path}")
+
+    def __getstate__(self):
+        return {"path": self.path, "areas": self.areas}
+
+    def __setstate__(self, state):
+        self.path = state["path"]
+        self.areas = state["areas"]
+        self.open_grids()
+
+    def sample(self, lon: Sequence, lat: Sequence) -> Dict[str, numpy.ndarray]:
+        """Sample all grids at the given coordinates, returns an array of values per grid."""
+        lon = numpy.asarray(lon, dtype=float)
+        lat = numpy.asarray(lat, dtype=float)
+        values = {}
+        indices = {}
+        for name, grid in self.grids.items():
+            if grid.shape not in indices:
+                indices[grid.shape] = grid_indices(grid, lon, lat)
+            values[name] = numpy.asarray(grid[indices[grid.shape]], dtype=float)
+        return values
+
+    def lookup(self, points: Sequence) -> List[Dict]:
+        """Look up points, results are shaped like those of the xylookup service."""
+        if len(points) == 0:
+            return []
+        points = numpy.asarray(points, dtype=float)
+        values = self.sample(points[:, 0], points[:, 1])
+        grids = [(name, values[name].tolist()) for name in GRIDS if name in values]
+        shoredistance = values[SHOREDISTANCE].tolist() if SHOREDISTANCE in values else None
+        areas = self.areas.query(points[:, 0], points[:, 1]) if self.areas is not None else None
+
+        results = []
+        for i in range(len(points)):
+            result = {
+                "grids": {name: column[i] for name, column in grids if column[i] == column[i]},
+                "areas": areas[i] if areas is not None else {}
+            }
+            if shoredistance is not None and shoredistance[i] == shoredistance[i]:
+                result["shoredistance"] = int(shoredistance[i])
+            results.append(result)
+        return results
@@ -0,0 +1,56 @@
+from typing import Dict, List
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from obisqc.util.sqlite import query_in
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_database_version(path: str) -> str:
+    """Fingerprint a WoRMS database using its size, modification time and SQLite header, which holds the file change counter."""
+    stat = os.stat(path)
+    with open(path, "rb") as f:
+        header = f.read(100)
+    dhash = hashlib.md5()
+    dhash.update(f"{stat.st_size}:{stat.st_mtime_ns}:".encode())
+    dhash.update(header)
+    return dhash.hexdigest()
+
+
+class MatchCache:
+    """Persistent cache of name matching results, cleared when the WoRMS database changes."""
+
+    def __init__(self, path: str, worms_db_path: str):
+        self.con = sqlite3.connect(path, timeout=60)
+        self.con.execute("create table if not exists meta (key text primary key, value text)")
+        self.con.execute("create table if not exists matches (name text primary key, result text)")
+        version = get_database_version(worms_db_path)
+        row = self.con.execute("select value from meta where key = 'worms_version'").fetchone()
+        if row is None or row[0] != version:
+            logger.info("WoRMS database has changed, clearing name matching cache")
+            self.con.execute("delete from matches")
+            self.con.execute("insert or replace into meta values ('worms_version', ?)", (version,))
+        self.con.commit()
+
+    def get_many(self, names: List[str]) -> Dict[str, List[Dict]]:
+        rows = query_in(self.con.cursor(), "select name, result from matches where name in ({placeholders})", list(set(names)))
+        return {name: json.loads(result) for name, result in rows}
+
+    def put_many(self, results: Dict[str, List[Dict]]) -> None:
+        self.con.executemany("insert or replace into matches values (?, ?)", [(name, json.dumps(result)) for name, result in results.items()])
+        self.con.commit()
+
+    def close(self) -> None:
+        self.con.close()
+
+
+def open_match_cache() -> MatchCache:
+    """Open the name matching cache at WORMS_MATCH_CACHE_PATH, if set."""
+    path = os.getenv("WORMS_MATCH_CACHE_PATH")
+    if path is None:
+        return None
+    return MatchCache(path, os.getenv("WORMS_DB_PATH"))
@@ -0,0 +1,89 @@
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from timeit import default_timer
+from typing import Dict
+import threading
+
+
+# collector receiving timings and counts in the current context, None when metrics are disabled
+collector: ContextVar = ContextVar("collector", default=None)
+
+NULL_TIMER = nullcontext()
+
+
+class Metrics:
+    """Collects wall time per stage, counters and cache statistics for one or more checks."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings: Dict[str, float] = defaultdict(float)
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.caches: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0})
+
+    @contextmanager
+    def timer(self, stage: str):
+        start = default_timer()
+        try:
+            yield
+        finally:
+            elapsed = default_timer() - start
+            with self.lock:
+                self.timings[stage] += elapsed
+
+    def count(self, key: str, n: int = 1) -> None:
+        with self.lock:
+            self.counts[key] += n
+
+    def report(self) -> Dict:
+        caches = {}
+        for name, stats in self.caches.items():
+            total = stats["hits"] + stats["misses"]
+            caches[name] = dict(stats, hit_ratio=stats["hits"] / total if total > 0 else None)
+        return {
+            "timings": {stage: round(seconds, 6) for stage, seconds in self.timings.items()},
+            "counts": dict(self.counts),
+            "caches": caches
+        }
+
+
+def get_caches() -> Dict:
+    from obisqc import time
+    from obisqc.util import names, xy_cache
+    caches = {"names": names.cache, "time": time.cache}
+    if xy_cache.default_cache is not None:
+        caches["xylookup"] = xy_cache.default_cache.memory
+    return caches
+
+
+@contextmanager
+def collect(metrics: Metrics):
+    """Send timings and counts to metrics for the duration of the block, and add the cache hits and misses. The
+    collector is bound to the current context, so concurrent checks in other threads collect into their own metrics.
+    Worker threads only report to it when run in a copy of the context. Cache statistics are per process and include
+    hits and misses of concurrent checks."""
+    if metrics is None or collector.get() is not None:
+        yield
+        return
+    before = {name: (cache.hits, cache.misses) for name, cache in get_caches().items()}
+    token = collector.set(metrics)
+    try:
+        yield
+    finally:
+        collector.reset(token)
+        for name, cache in get_caches().items():
+            hits, misses = before.get(name, (0, 0))
+            metrics.caches[name]["hits"] += cache.hits - hits
+            metrics.caches[name]["misses"] += cache.misses - misses
+
+
+def timer(stage: str):
+    """Time a block if metrics are being collected."""
+    current = collector.get()
+    return current.timer(stage) if current is not None else NULL_TIMER
+
+
+def count(key: str, n: int = 1) -> None:
+    current = collector.get()
+    if current is not None:
+        current.count(key, n)
@@ -1,7 +1,10 @@
-from typing import List
-import pyxylookup
+from typing import Dict, Iterable, Iterator, List
+from itertools import islice
+import numpy
 
 from obisqc.model import Record
+from obisqc.util import metrics, xylookup
+from obisqc.util.xy_cache import XYCache, get_default_cache
 
 
 def check_float(value, valid_range=None):
@@ -24,17 +27,88 @@ def check_float(value, valid_range=None):
     return result
 
 
-def do_xylookup(records: List[Record]) -> None:
-    output = [None] * len(records)
-    indices = []
-    coordinates = []
-    for i in range(len(records)):
-        record = records[i]
-        if record.get_interpreted("decimalLongitude") is not None and record.get_interpreted("decimalLatitude") is not None:
-            indices.append(i)
-            coordinates.append([record.get_interpreted("decimalLongitude"), record.get_interpreted("decimalLatitude")])
-    if len(coordinates) > 0:
-        xy = pyxylookup.lookup(coordinates, shoredistance=True, grids=True, areas=True)
-        for i in range(len(indices)):
-            output[indices[i]] = xy[i]
-    return output
+def check_float_array(values, valid_range=None) -> Dict[str, numpy.ndarray]:
+    """Vectorized version of check_float for a column of values, missing values are None."""
+    values = numpy.array(values, dtype=object)
+    present = numpy.array([value is not None for value in values], dtype=bool)
+    floats = numpy.full(len(values), numpy.nan)
+    parsed = numpy.zeros(len(values), dtype=bool)
+
+    indices = numpy.flatnonzero(present)
+    try:
+        floats[indices] = values[indices].astype(float)
+        parsed[indices] = True
+    except ValueError:
+        for i in indices:
+            try:
+                floats[i] = float(values[i])
+                parsed[i] = True
+            except ValueError:
+                pass
+
+    if valid_range is not None:
+        in_range = parsed & (valid_range[0] <= floats) & (floats <= valid_range[1])
+    else:
+        in_range = parsed.copy()
+    floats[~in_range] = numpy.nan
+
+    return {
+        "present": present,
+        "parsed": parsed,
+        "in_range": in_range,
+        "valid": in_range,
+        "float": floats
+    }
+
+
+def chunks(iterable: Iterable, size: int) -> Iterator[List]:
+    """Split an iterable into lists of at most size elements."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+
+def do_xylookup(records: List[Record], cache: XYCache = None, provider=None) -> List[Dict]:
+    """Look up environmental data and areas for all records with coordinates. Distinct coordinates are only sent to
+    the xylookup service once, in concurrent batches, and results are kept in the xylookup cache. A local provider
+    such as LocalXYLookup is queried directly, without cache."""
+
+    if provider is not None:
+        output = [None] * len(records)
+        indices = []
+        points = []
+        for i, record in enumerate(records):
+            lon = record.get_interpreted("decimalLongitude")
+            lat = record.get_interpreted("decimalLatitude")
+            if lon is not None and lat is not None:
+                indices.append(i)
+                points.append((lon, lat))
+        for i, result in zip(indices, provider.lookup(points)):
+            output[i] = result
+        return output
+
+    if cache is None:
+        cache = get_default_cache()
+
+    keys = [None] * len(records)
+    for i, record in enumerate(records):
+        lon = record.get_interpreted("decimalLongitude")
+        lat = record.get_interpreted("decimalLatitude")
+        if lon is not None and lat is not None:
+            keys[i] = cache.key(lon, lat)
+
+    distinct = list(dict.fromkeys(key for key in keys if key is not None))
+    results = cache.get_many(distinct)
+    missing = [key for key in distinct if key not in results]
+    metrics.count("xylookup.unique", len(distinct))
+    metrics.count("xylookup.requested", len(missing))
+    if len(missing) > 0:
+        xy = xylookup.lookup(missing)
+        fetched = dict(zip(missing, xy))
+        cache.put_many(fetched)
+        results.update(fetched)
+
+    return [results[key] if key is not None else None for key in keys]
@@ -0,0 +1,66 @@
+from typing import Dict, List, Tuple
+from obisqc.util import metrics
+from obisqc.util.cache import LRUCache
+import ctypes
+import json
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+# number of names sent to gnparser in a single call
+PARSE_BATCH_SIZE = 10000
+
+# parsed names, shared by all taxonomy checks in this process
+cache = LRUCache()
+
+
+def extract_name(parsed: Dict) -> Tuple[str, str]:
+    """Get the canonical name and authorship from a gnparser result."""
+    if parsed.get("parsed"):
+        canonical = parsed.get("canonical", None).get("full", None)
+        authorship = parsed.get("authorship", {}).get("normalized", None)
+        return canonical, authorship
+    else:
+        return None, None
+
+
+def parse_batch(names: List[str]) -> List[Dict]:
+    """Parse a list of names with a single gnparser call, falls back to parsing names one by one."""
+    import gnparser
+
+    if hasattr(gnparser.lib, "ParseAryToString"):
+        gnparser.lib.ParseAryToString.argtypes = [ctypes.POINTER(ctypes.c_char_p), ctypes.c_int, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int, ctypes.c_int]
+        gnparser.lib.ParseAryToString.restype = ctypes.c_char_p
+        names_array = (ctypes.c_char_p * len(names))(*[name.encode("utf-8") for name in names])
+        result = gnparser.lib.ParseAryToString(names_array, len(names), b"compact", None, 1, 1)
+        parsed = json.loads(ctypes.string_at(result).decode("utf-8"))
+        if len(parsed) == len(names) and all(item.get("verbatim") == name for item, name in zip(parsed, names)):
+            return parsed
+        logger.warning("Batch parsing returned unexpected results, parsing names one by one")
+
+    return [json.loads(gnparser.parse_to_string(name, "compact", None, 1, 1)) for name in names]
+
+
+def parse_names(names: List[str]) -> List[Tuple[str, str]]:
+    """Parse names to (canonical, authorship) tuples. Names are looked up in the cache first, and all remaining distinct
+    names are parsed in batches."""
+
+    results = {}
+    missing = []
+    for name in dict.fromkeys(names):
+        value = cache.get(name)
+        if value is None:
+            missing.append(name)
+        else:
+            results[name] = value
+
+    metrics.count("gnparser.names", len(missing))
+    for i in range(0, len(missing), PARSE_BATCH_SIZE):
+        batch = missing[i:i + PARSE_BATCH_SIZE]
+        for name, parsed in zip(batch, parse_batch(batch)):
+            value = extract_name(parsed)
+            cache.put(name, value)
+            results[name] = value
+
+    return [results[name] for name in names]
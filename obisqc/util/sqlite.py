@@ -0,0 +1,25 @@
+from typing import List
+import sqlite3
+from obisqc.util import metrics
+
+
+# stay well below the SQLite limit on the number of host parameters
+SQLITE_CHUNK_SIZE = 500
+
+
+def chunk_by_size(lst: List, size: int) -> List[List]:
+    return [lst[i:i + size] for i in range(0, len(lst), size)]
+
+
+def query_in(cur: sqlite3.Cursor, query: str, values: list) -> list:
+    """Run a query containing "in ({placeholders})" for any number of values. Values are sent in chunks padded with NULL,
+    so all chunks share a single statement which is prepared once per connection."""
+    placeholders = ",".join("?" * SQLITE_CHUNK_SIZE)
+    sql = query.format(placeholders=placeholders)
+    rows = []
+    for chunk in chunk_by_size(values, SQLITE_CHUNK_SIZE):
+        cur.execute(sql, chunk + [None] * (SQLITE_CHUNK_SIZE - len(chunk)))
+        rows.extend(cur.fetchall())
+        metrics.count("sql.queries")
+    metrics.count("sql.rows", len(rows))
+    return rows
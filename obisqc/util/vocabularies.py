@@ -1,24 +1,34 @@
 import requests
 import io
+import json
+import os
 import xmltodict
 import logging
 from functools import lru_cache
+from typing import Dict, FrozenSet, List
 import urllib3
 
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 logger = logging.getLogger(__name__)
 
+VOCABULARY_DEFINITIONS = {
+    "dwc:basisOfRecord": "https://rs.gbif.org/vocabulary/dwc/basis_of_record_2022-02-02.xml"
+}
 
-@lru_cache
-def get_vocabularies() -> dict:
-    vocabularies = {}
+# snapshot of the vocabularies above, used unless a snapshot is provided at VOCABULARIES_PATH
+BUNDLED_VOCABULARIES = {
+    "dwc:basisOfRecord": [
+        "PreservedSpecimen", "FossilSpecimen", "LivingSpecimen", "MaterialSample", "Event", "HumanObservation",
+        "MachineObservation", "Taxon", "Occurrence", "MaterialCitation"
+    ]
+}
 
-    vocabulary_definitions = {
-        "dwc:basisOfRecord": "https://rs.gbif.org/vocabulary/dwc/basis_of_record_2022-02-02.xml"
-    }
 
-    for field, url in vocabulary_definitions.items():
+def fetch_vocabularies() -> Dict[str, List[str]]:
+    vocabularies = {}
+
+    for field, url in VOCABULARY_DEFINITIONS.items():
         logger.info(f"Fetching vocabulary for {field}")
         res = requests.get(url, timeout=10, verify=False)
         content = io.BytesIO(res.content)
@@ -27,3 +37,32 @@ def get_vocabularies() -> dict:
         vocabularies[field] = values
 
     return vocabularies
+
+
+def refresh_vocabularies(path: str = None) -> None:
+    """Download the vocabularies and store them as a local snapshot at path or VOCABULARIES_PATH."""
+    path = path or os.getenv("VOCABULARIES_PATH")
+    if path is None:
+        raise RuntimeError("VOCABULARIES_PATH is not set")
+    vocabularies = fetch_vocabularies()
+    with open(path + ".tmp", "w") as f:
+        json.dump(vocabularies, f)
+    os.replace(path + ".tmp", path)
+    get_vocabularies.cache_clear()
+    get_vocabulary.cache_clear()
+
+
+@lru_cache
+def get_vocabularies() -> dict:
+    """Load the vocabularies from the snapshot at VOCABULARIES_PATH if present, or from the bundled snapshot."""
+    path = os.getenv("VOCABULARIES_PATH")
+    if path is not None and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return BUNDLED_VOCABULARIES
+
+
+@lru_cache
+def get_vocabulary(field: str) -> FrozenSet[str]:
+    """Get the lowercase values of a vocabulary."""
+    return frozenset(value.lower() for value in get_vocabularies()[field])
@@ -0,0 +1,106 @@
+from typing import Dict, Iterable, Optional, Tuple
+from obisqc.util.cache import LRUCache
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+# default cache, created on first use from XYLOOKUP_CACHE_PATH and XYLOOKUP_CACHE_PRECISION
+default_cache = None
+
+
+class XYCache:
+    """Cache of xylookup results keyed on coordinates, bounded in memory with optional persistence in a SQLite database.
+    When precision is set, coordinates are rounded to that number of decimals before lookup. The database connection is
+    kept per thread and process, so the cache can be shared between threads."""
+
+    def __init__(self, path: str = None, precision: int = None, maxsize: int = 100000):
+        self.path = path
+        self.precision = precision
+        self.memory = LRUCache(maxsize)
+        self.local = threading.local()
+        # all connections opened for this cache as (pid, connection) tuples, so close() can reach every thread
+        self.connections = []
+        self.lock = threading.Lock()
+
+    def key(self, lon: float, lat: float) -> Tuple[float, float]:
+        if self.precision is None:
+            return float(lon), float(lat)
+        return round(float(lon), self.precision), round(float(lat), self.precision)
+
+    def connection(self) -> Optional[sqlite3.Connection]:
+        if self.path is None:
+            return None
+        pid = os.getpid()
+        if getattr(self.local, "pid", None) != pid:
+            # only used by this thread, but close() may be called from another one
+            con = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            con.execute("create table if not exists xylookup (lon real, lat real, result text, primary key (lon, lat))")
+            con.commit()
+            with self.lock:
+                self.connections.append((pid, con))
+            self.local.pid = pid
+            self.local.con = con
+        return self.local.con
+
+    def get_many(self, keys: Iterable[Tuple[float, float]]) -> Dict[Tuple[float, float], Dict]:
+        results = {}
+        missing = []
+        for key in keys:
+            value = self.memory.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                results[key] = value
+
+        con = self.connection()
+        if con is not None:
+            for i in range(0, len(missing), 250):
+                chunk = missing[i:i + 250]
+                conditions = " or ".join(["(lon = ? and lat = ?)"] * len(chunk))
+                params = [value for key in chunk for value in key]
+                for lon, lat, result in con.execute(f"select lon, lat, result from xylookup where {conditions}", params):
+                    value = json.loads(result)
+                    self.memory.put((lon, lat), value)
+                    results[(lon, lat)] = value
+
+        return results
+
+    def put_many(self, results: Dict[Tuple[float, float], Dict]) -> None:
+        for key, value in results.items():
+            self.memory.put(key, value)
+        con = self.connection()
+        if con is not None:
+            con.executemany("insert or replace into xylookup values (?, ?, ?)", [(key[0], key[1], json.dumps(value)) for key, value in results.items()])
+            con.commit()
+
+    def clear(self) -> None:
+        self.memory.clear()
+        con = self.connection()
+        if con is not None:
+            con.execute("delete from xylookup")
+            con.commit()
+
+    def close(self) -> None:
+        """Close the connections of all threads. Connections inherited from a parent process are kept referenced, so
+        they are never closed, and so never touched, in a forked child."""
+        pid = os.getpid()
+        with self.lock:
+            for owner, con in self.connections:
+                if owner == pid:
+                    con.close()
+            self.connections = [(owner, con) for owner, con in self.connections if owner != pid]
+            self.local = threading.local()
+
+
+def get_default_cache() -> XYCache:
+    """Get the xylookup cache used by default, persisted at XYLOOKUP_CACHE_PATH if set."""
+    global default_cache
+    if default_cache is None:
+        precision = os.getenv("XYLOOKUP_CACHE_PRECISION")
+        default_cache = XYCache(os.getenv("XYLOOKUP_CACHE_PATH"), int(precision) if precision else None)
+    return default_cache
@@ -0,0 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+from typing import Dict, List, Sequence
+import logging
+import os
+import time
+import msgpack
+import requests
+from obisqc.util import metrics
+
+
+logger = logging.getLogger(__name__)
+
+XYLOOKUP_URL = "https://api.obis.org/xylookup/"
+
+# number of points per request, and number of requests in flight
+BATCH_SIZE = 5000
+WORKERS = 4
+
+# attempts per batch, waiting BACKOFF * 2 ** attempt seconds between attempts
+RETRIES = 3
+BACKOFF = 1.0
+TIMEOUT = 300
+
+# status codes which are worth retrying
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def get_url() -> str:
+    return os.getenv("XYLOOKUP_URL", XYLOOKUP_URL)
+
+
+def lookup_batch(session: requests.Session, url: str, points: Sequence, retries: int = RETRIES, backoff: float = BACKOFF) -> List[Dict]:
+    """Look up a single batch of points, retrying transient failures with exponential backoff."""
+    data = msgpack.dumps({
+        "points": [list(point) for point in points],
+        "shoredistance": True,
+        "grids": True,
+        "areas": True,
+        "areasdistancewithin": 0
+    })
+    headers = {"content-type": "application/msgpack"}
+
+    attempt = 0
+    while True:
+        try:
+            response = session.post(url, data=data, headers=headers, timeout=TIMEOUT)
+            if response.status_code == 200:
+                results = msgpack.loads(response.content, raw=False)
+                if len(results) != len(points):
+                    raise RuntimeError(f"xylookup returned {len(results)} results for {len(points)} points")
+                return results
+            if response.status_code not in RETRY_STATUS:
+                raise RuntimeError(f"xylookup request failed with status {response.status_code}: {response.content[:200]}")
+            error = f"status {response.status_code}"
+        except requests.RequestException as e:
+            error = str(e)
+
+        attempt += 1
+        metrics.count("xylookup.failures")
+        if attempt >= retries:
+            raise RuntimeError(f"xylookup request failed after {attempt} attempts: {error}")
+        delay = backoff * 2 ** (attempt - 1)
+        logger.warning(f"xylookup request failed ({error}), retrying in {delay:.1f} s")
+        time.sleep(delay)
+
+
+def lookup(points: Sequence, batch_size: int = BATCH_SIZE, workers: int = WORKERS, retries: int = RETRIES, backoff: float = BACKOFF, url: str = None) -> List[Dict]:
+    """Look up points in batches with at most workers concurrent requests, results are returned in the order of the points."""
+    if len(points) == 0:
+        return []
+    if url is None:
+        url = get_url()
+    batches = [points[i:i + batch_size] for i in range(0, len(points), batch_size)]
+    metrics.count("xylookup.batches", len(batches))
+    results = []
+    with requests.Session() as session:
+        session.mount(url, requests.adapters.HTTPAdapter(pool_maxsize=max(workers, 1)))
+        if len(batches) == 1 or workers <= 1:
+            for batch in batches:
+                results.extend(lookup_batch(session, url, batch, retries, backoff))
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # run each batch in a copy of the current context so metrics reach the caller's collector
+                futures = [executor.submit(contextvars.copy_context().run, lookup_batch, session, url, batch, retries, backoff) for batch in batches]
+                for future in futures:
+                    results.extend(future.result())
+    return results
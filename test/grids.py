@@ -0,0 +1,16 @@
+import numpy
+
+
+def create_grids(path: str, resolution: float = 1.0) -> None:
+    """Create synthetic global grids for obisqc.util.local_xylookup: land north of 60 degrees latitude, depth
+    increasing to the east, and missing temperatures west of -170 degrees longitude."""
+    lat = 90 - (numpy.arange(int(180 / resolution)) + 0.5) * resolution
+    lon = -180 + (numpy.arange(int(360 / resolution)) + 0.5) * resolution
+    lon, lat = numpy.meshgrid(lon, lat)
+    land = lat > 60
+    bathymetry = numpy.where(land, -100.0, lon + 180).astype(numpy.float32)
+    sstemperature = numpy.where(lon < -170, numpy.nan, 28 - numpy.abs(lat) / 3).astype(numpy.float32)
+    sssalinity = numpy.full(lat.shape, 35.0, dtype=numpy.float32)
+    shoredistance = numpy.where(land, -1000.0, (60 - lat) * 111000).astype(numpy.float32)
+    for name, grid in [("bathymetry", bathymetry), ("sstemperature", sstemperature), ("sssalinity", sssalinity), ("shoredistance", shoredistance)]:
+        numpy.save(f"{path}/{name}.npy", grid)
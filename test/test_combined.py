@@ -1,8 +1,14 @@
 import unittest
+import json
 import logging
+import os
+import tempfile
 from obisqc.util.flags import Flag
 from obisqc.model import Record
-from obisqc import check
+from obisqc import check, check_iter, check_parallel
+from obisqc.util import aphia, metrics
+from obisqc.util.metrics import Metrics
+from test.worms import create_worms_db
 
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)-12s %(levelname)-8s %(message)s", datefmt="%H:%M:%S")
@@ -25,6 +31,92 @@ class TestCombined(unittest.TestCase):
         self.assertTrue(records[0].get_interpreted("decimalLongitude") == 7.3)
         self.assertTrue(records[0].get_interpreted("decimalLatitude") == 50.3)
 
+    def test_check_iter(self):
+        records = (Record(decimalLongitude=i, decimalLatitude=51.3, eventDate="2010") for i in range(5))
+        results = list(check_iter(records, chunk_size=2))
+        self.assertEqual(len(results), 5)
+        self.assertEqual([record.get_interpreted("decimalLongitude") for record in results], [0, 1, 2, 3, 4])
+        self.assertEqual(results[4].get_interpreted("date_year"), 2010)
+        self.assertNotIn(Flag.NO_COORD, results[4].flags)
+
+    def test_check_metrics(self):
+        collector = Metrics()
+        records = [Record(decimalLongitude=i % 2, decimalLatitude=51.3, eventDate="2010" if i % 2 else "2011-01-01") for i in range(4)]
+        list(check_iter(records, chunk_size=2, metrics=collector))
+        report = collector.report()
+        for stage in ["absence", "fields", "time", "taxonomy", "taxonomy.group", "location"]:
+            self.assertGreaterEqual(report["timings"][stage], 0)
+        self.assertEqual(report["counts"]["records"], 4)
+        self.assertEqual(report["counts"]["time.unique"], 4)
+        self.assertEqual(report["counts"]["taxonomy.keys"], 2)
+        self.assertEqual(report["counts"]["taxonomy.cached"], 1)
+        self.assertEqual(report["caches"]["time"]["hits"] + report["caches"]["time"]["misses"], 4)
+        self.assertIsNone(metrics.collector.get())
+
+    def test_check_parallel(self):
+        data = [
+            {"occurrenceStatus": "absent", "decimalLongitude": "2.1", "decimalLatitude": "51.3", "eventDate": "2010-01-01"},
+            {"basisOfRecord": " HumanObservation", "decimalLongitude": 0, "decimalLatitude": 0, "minimumDepthInMeters": 10},
+            {"scientificNameID": " abc ", "eventDate": "2300", "individualCount": "0"},
+            {"scientificNameID": "abc", "decimalLongitude": 200}
+        ]
+        records = [Record(data=item) for item in data]
+        expected = [Record(data=item) for item in data]
+        check_parallel(records, workers=2, chunk_size=1, taxa_chunk_size=1)
+        check(expected)
+        self.assertFalse(records[1].is_invalid("basisOfRecord"))
+        for record, expected_record in zip(records, expected):
+            self.assertEqual(record.flags, expected_record.flags)
+            self.assertEqual(record.dropped, expected_record.dropped)
+            self.assertEqual(record.absence, expected_record.absence)
+            self.assertEqual(sorted(record.fields.keys()), sorted(expected_record.fields.keys()))
+            for field in expected_record.fields:
+                self.assertEqual(record.get(field), expected_record.get(field))
+                self.assertEqual(record.is_invalid(field), expected_record.is_invalid(field))
+                self.assertEqual(record.is_missing(field), expected_record.is_missing(field))
+                self.assertEqual(record.get_interpreted(field), expected_record.get_interpreted(field))
+
+
+
+class TestParallel(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tempdir = tempfile.TemporaryDirectory()
+        cls.environ = {key: os.environ.get(key) for key in ["WORMS_DB_PATH", "ANNOTATED_LIST_PATH"]}
+        os.environ["WORMS_DB_PATH"] = os.path.join(cls.tempdir.name, "worms.db")
+        os.environ["ANNOTATED_LIST_PATH"] = os.path.join(cls.tempdir.name, "annotations.json")
+        create_worms_db(os.environ["WORMS_DB_PATH"])
+        with open(os.environ["ANNOTATED_LIST_PATH"], "w") as f:
+            json.dump({"version": aphia.ANNOTATED_LIST_SNAPSHOT_VERSION, "created": "2024-01-01", "results": []}, f)
+        aphia.annotated_list = None
+
+    @classmethod
+    def tearDownClass(cls):
+        aphia.close_connection()
+        aphia.annotated_list = None
+        for key, value in cls.environ.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        cls.tempdir.cleanup()
+
+    def test_check_parallel_after_check(self):
+        """gnparser is loaded in this process first, workers must not inherit it. Names in the second run are not in the
+        name parsing cache so the workers parse them."""
+        check([Record(scientificName="Abra alba")])
+        data = [{"scientificName": name, "decimalLongitude": "2.1", "decimalLatitude": "51.3"} for name in ["Abra", "Orca gladiator", "Punctum minutissimum", "not a name"]]
+        records = [Record(data=item) for item in data]
+        check_parallel(records, workers=2, chunk_size=2, taxa_chunk_size=2)
+        expected = [Record(data=item) for item in data]
+        check(expected)
+        self.assertEqual(records[0].get_interpreted("aphiaid"), 138474)
+        for record, expected_record in zip(records, expected):
+            self.assertEqual(record.flags, expected_record.flags)
+            self.assertEqual(record.dropped, expected_record.dropped)
+            self.assertEqual(record.get_interpreted("aphiaid"), expected_record.get_interpreted("aphiaid"))
+
 
 if __name__ == "__main__":
     unittest.main()
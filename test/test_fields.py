@@ -1,6 +1,10 @@
 import unittest
+import json
+import os
+import tempfile
 from obisqc import fields
 from obisqc.model import Record
+from obisqc.util import vocabularies
 
 
 class TestFields(unittest.TestCase):
@@ -20,6 +24,27 @@ class TestFields(unittest.TestCase):
         self.assertTrue(records[3].is_invalid("basisOfRecord"))
         self.assertFalse(records[4].is_invalid("basisOfRecord"))
 
+    def test_check_columns(self):
+        columns = fields.check_columns([None, "HumanObservation", "humanobservation", "human observation", "HumanObservation"])
+        self.assertEqual(columns["basisOfRecord"]["present"].tolist(), [False, True, True, True, True])
+        self.assertEqual(columns["basisOfRecord"]["invalid"].tolist(), [False, False, False, True, False])
+
+    def test_vocabulary_snapshot(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "vocabularies.json")
+            with open(path, "w") as f:
+                json.dump({"dwc:basisOfRecord": ["HumanObservation"]}, f)
+            os.environ["VOCABULARIES_PATH"] = path
+            vocabularies.get_vocabularies.cache_clear()
+            vocabularies.get_vocabulary.cache_clear()
+            try:
+                self.assertEqual(vocabularies.get_vocabulary("dwc:basisOfRecord"), frozenset(["humanobservation"]))
+            finally:
+                del os.environ["VOCABULARIES_PATH"]
+                vocabularies.get_vocabularies.cache_clear()
+                vocabularies.get_vocabulary.cache_clear()
+        self.assertIn("materialcitation", vocabularies.get_vocabulary("dwc:basisOfRecord"))
+
 
 if __name__ == "__main__":
     unittest.main()
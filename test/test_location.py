@@ -1,5 +1,10 @@
 import unittest
+import json
+import pickle
+import tempfile
 from obisqc import location
+from obisqc.util.local_xylookup import LocalXYLookup
+from test.grids import create_grids
 from obisqc.util.flags import Flag
 from obisqc.model import Record
 
@@ -162,6 +167,56 @@ class TestLocation(unittest.TestCase):
         self.assertNotIn(Flag.DEPTH_OUT_OF_RANGE, records[0].flags)
         self.assertTrue(records[0].is_invalid("minimumDepthInMeters"))
 
+    def test_check_columns(self):
+        data = [
+            {"decimalLongitude": "2.1", "decimalLatitude": "51.3", "coordinateUncertaintyInMeters": "100"},
+            {"decimalLongitude": 0, "decimalLatitude": 0, "minimumDepthInMeters": 10, "maximumDepthInMeters": 2},
+            {"decimalLongitude": "abc", "decimalLatitude": 100, "coordinateUncertaintyInMeters": 0},
+            {"decimalLongitude": "nan", "minimumDepthInMeters": "NA", "maximumDepthInMeters": 12000},
+            {"decimalLongitude": " 2.5 ", "decimalLatitude": "-0", "minimumDepthInMeters": "2", "maximumDepthInMeters": "5"},
+            {"minimumDepthInMeters": 12000, "maximumDepthInMeters": 3},
+            {}
+        ]
+        records = [Record(data=item) for item in data]
+        expected = [Record(data=item) for item in data]
+        location.check(records)
+        for record in expected:
+            location.check_record(record)
+        for record, expected_record in zip(records, expected):
+            self.assertEqual(record.flags, expected_record.flags)
+            self.assertEqual(record.dropped, expected_record.dropped)
+            self.assertEqual(list(record.fields.keys()), list(expected_record.fields.keys()))
+            for field in expected_record.fields:
+                self.assertEqual(record.is_invalid(field), expected_record.is_invalid(field))
+                self.assertEqual(record.is_missing(field), expected_record.is_missing(field))
+                self.assertEqual(record.has_interpreted(field), expected_record.has_interpreted(field))
+                self.assertEqual(record.get_interpreted(field), expected_record.get_interpreted(field))
+
+    def test_local_xylookup(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            create_grids(tmp)
+            with open(f"{tmp}/eez.geojson", "w") as f:
+                json.dump({"type": "FeatureCollection", "features": [
+                    {"type": "Feature", "properties": {"id": 5, "name": "Test"}, "geometry": {"type": "Polygon", "coordinates": [[[0, 40], [20, 40], [20, 60], [0, 60], [0, 40]]]}}
+                ]}, f)
+            provider = LocalXYLookup(tmp, areas_path=tmp)
+            records = [
+                Record(decimalLongitude="10.2", decimalLatitude="50.5", maximumDepthInMeters="100"),
+                Record(decimalLongitude="-175.5", decimalLatitude="70.5"),
+                Record(decimalLongitude="-175.5", decimalLatitude="-20.5"),
+                Record()
+            ]
+            location.check(records, xylookup=pickle.loads(pickle.dumps(provider)))
+            self.assertEqual(records[0].get_interpreted("bathymetry"), 190.5)
+            self.assertEqual(records[0].get_interpreted("sss"), 35.0)
+            self.assertEqual(records[0].get_interpreted("areas"), [5])
+            self.assertEqual(records[2].get_interpreted("areas"), [])
+            self.assertNotIn(Flag.DEPTH_EXCEEDS_BATH, records[0].flags)
+            self.assertNotIn(Flag.ON_LAND, records[0].flags)
+            self.assertIn(Flag.ON_LAND, records[1].flags)
+            self.assertIsNone(records[2].get_interpreted("sst"))
+            self.assertIsNone(records[3].get_interpreted("shoredistance"))
+
     def test_shoredistance(self):
         records = [
             Record(decimalLongitude=2.1, decimalLatitude=51.3),
@@ -0,0 +1,115 @@
+import unittest
+import pickle
+from obisqc.model import Field, Record, Taxon, NOT_INTERPRETED
+
+
+class TestModel(unittest.TestCase):
+
+    def test_interpreted(self):
+        record = Record(decimalLongitude="2.1")
+        self.assertFalse(record.has_interpreted("decimalLongitude"))
+        self.assertIsNone(record.get_interpreted("decimalLongitude"))
+        record.set_interpreted("decimalLongitude", None)
+        self.assertTrue(record.has_interpreted("decimalLongitude"))
+        self.assertIsNone(record.get_interpreted("decimalLongitude"))
+        record.set_interpreted("decimalLongitude", 2.1)
+        self.assertEqual(record.get_interpreted("decimalLongitude"), 2.1)
+        self.assertEqual(record.get("decimalLongitude"), "2.1")
+
+    def test_lazy_containers(self):
+        record = Record()
+        self.assertIsNone(record._extensions)
+        self.assertIsNone(record._extras)
+        record.extensions["emof"] = [Record(measurementType="length")]
+        record.extras["id"] = 1
+        self.assertEqual(len(record.extensions["emof"]), 1)
+        self.assertEqual(record.extras["id"], 1)
+
+    def test_slots(self):
+        with self.assertRaises(AttributeError):
+            Record().unknown = True
+
+    def test_pickle(self):
+        record = Record(scientificName="Abra alba")
+        record.set_invalid("scientificNameID")
+        copy = pickle.loads(pickle.dumps(record))
+        self.assertIs(copy.fields["scientificName"].interpreted, NOT_INTERPRETED)
+        self.assertFalse(copy.has_interpreted("scientificName"))
+        self.assertTrue(copy.is_invalid("scientificNameID"))
+        taxon = Taxon()
+        taxon.aphiaid = 141433
+        self.assertEqual(pickle.loads(pickle.dumps(taxon)).aphiaid, 141433)
+
+    def test_taxonomy_key(self):
+        a = Record(scientificName="Abra alba ", scientificNameID="urn:lsid:marinespecies.org:taxname:141433", eventDate="2010")
+        b = Record(scientificNameID="urn:lsid:marinespecies.org:taxname:141433", scientificName="Abra alba", kingdom=" ")
+        c = Record(scientificName="Abra alba")
+        for record in [a, b, c]:
+            record.trim_whitespace()
+        self.assertEqual(a.get_taxonomy_key(), b.get_taxonomy_key())
+        self.assertNotEqual(a.get_taxonomy_key(), c.get_taxonomy_key())
+        self.assertEqual(Record(eventDate="2010").get_taxonomy_key(), ())
+        for x, y in [(a, b), (a, c), (b, c)]:
+            tx = x.get_taxonomy()
+            ty = y.get_taxonomy()
+            self.assertEqual(x.get_taxonomy_key() == y.get_taxonomy_key(), tx.get_hash() == ty.get_hash())
+
+    def test_merge_taxonomy(self):
+        taxon = Taxon()
+        taxon.set("scientificName", "Abra alba")
+        taxon.set_interpreted("aphiaid", 141433)
+        records = [Record(scientificName="Abra alba ", eventDate="2010"), Record(scientificName="Abra alba")]
+        for record in records:
+            record.merge_taxonomy(taxon)
+        self.assertIs(records[0].taxon, records[1].taxon)
+        self.assertNotIn("scientificName", records[0]._fields)
+        self.assertEqual(records[0].fields["scientificName"].verbatim, "Abra alba")
+        self.assertEqual(records[0].get("scientificName"), "Abra alba")
+        self.assertEqual(records[0].get("eventDate"), "2010")
+        self.assertEqual(records[0].get_interpreted("aphiaid"), 141433)
+        self.assertIn("aphiaid", records[0].get_fields())
+        taxon.set_interpreted("terrestrial", False)
+        self.assertNotIn("terrestrial", records[0].fields)
+        records[0].set_interpreted("aphiaid", 1)
+        records[0].set_invalid("scientificName")
+        self.assertEqual(records[0].get_interpreted("aphiaid"), 1)
+        self.assertEqual(records[1].get_interpreted("aphiaid"), 141433)
+        self.assertTrue(records[0].is_invalid("scientificName"))
+        self.assertFalse(records[1].is_invalid("scientificName"))
+        self.assertEqual(records[0].get_taxonomy_key(), records[1].get_taxonomy_key())
+
+    def test_fields_read_only(self):
+        taxon = Taxon()
+        taxon.set("scientificName", "Abra alba")
+        records = [Record(scientificName="Abra alba", eventDate="2010"), Record(scientificName="Abra alba")]
+        for record in records:
+            record.merge_taxonomy(taxon)
+        with self.assertRaises(TypeError):
+            records[0].fields["scientificName"] = Field("Abra")
+        with self.assertRaises(TypeError):
+            records[1].fields["eventDate"] = Field("2011")
+        records[0].own_field("scientificName").verbatim = "Abra"
+        self.assertEqual(records[0].fields["scientificName"].verbatim, "Abra")
+        self.assertEqual(records[1].fields["scientificName"].verbatim, "Abra alba")
+        self.assertEqual(taxon.get("scientificName"), "Abra alba")
+        records[1].fields = {"eventDate": Field("2011")}
+        self.assertEqual(records[1].get("eventDate"), "2011")
+        self.assertEqual(records[1].get("scientificName"), "Abra alba")
+
+    def test_trim_whitespace(self):
+        record = Record(scientificName=" Abra alba ", eventDate="2010", basisOfRecord="  ")
+        clean = record.get("eventDate")
+        record.set_invalid("scientificName")
+        record.set_interpreted("scientificName", "Abra alba")
+        field = record.fields["scientificName"]
+        record.trim_whitespace()
+        self.assertIs(record.fields["scientificName"], field)
+        self.assertEqual(record.get("scientificName"), "Abra alba")
+        self.assertTrue(record.is_invalid("scientificName"))
+        self.assertEqual(record.get_interpreted("scientificName"), "Abra alba")
+        self.assertIs(record.get("eventDate"), clean)
+        self.assertIsNone(record.get("basisOfRecord"))
+
+
+if __name__ == "__main__":
+    unittest.main()
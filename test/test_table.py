@@ -0,0 +1,101 @@
+import math
+import unittest
+from obisqc import check, check_table
+from obisqc.model import Record
+from obisqc.util.flags import Flag, FLAG_BITS, FlagSet
+from obisqc.util.metrics import Metrics
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+DATA = [
+    {"occurrenceStatus": "absent", "decimalLongitude": "2.1", "decimalLatitude": "51.3", "eventDate": "2010-01-01"},
+    {"basisOfRecord": " HumanObservation", "decimalLongitude": "0", "decimalLatitude": "0", "minimumDepthInMeters": "10"},
+    {"scientificNameID": " abc ", "eventDate": "2300", "individualCount": "0"},
+    {"scientificNameID": "abc", "decimalLongitude": "200", "minimumDepthInMeters": "20", "maximumDepthInMeters": "5"},
+    {"occurrenceStatus": "present", "basisOfRecord": "Specimen", "decimalLongitude": "", "decimalLatitude": "51.3", "coordinateUncertaintyInMeters": "100", "eventDate": "1200"}
+]
+FIELDS = sorted({field for item in DATA for field in item})
+
+
+def to_dict(data):
+    return {field: [item.get(field) for item in data] for field in FIELDS}
+
+
+def as_float(value):
+    return math.nan if value is None else float(value)
+
+
+class TestTable(unittest.TestCase):
+
+    def assert_matches_records(self, results):
+        records = [Record(data=item) for item in DATA]
+        check(records)
+        for i, record in enumerate(records):
+            self.assertEqual(FlagSet(mask=int(results["flags"][i])), record.flags)
+            self.assertEqual(bool(results["dropped"][i]), bool(record.dropped))
+            self.assertEqual(bool(results["absence"][i]), record.absence)
+            self.assertEqual(bool(results["basisOfRecord_missing"][i]), bool(record.is_missing("basisOfRecord")))
+            self.assertEqual(bool(results["basisOfRecord_invalid"][i]), bool(record.is_invalid("basisOfRecord")))
+            for field in ["decimalLongitude", "decimalLatitude", "coordinateUncertaintyInMeters", "minimumDepthInMeters", "maximumDepthInMeters", "depth", "date_start", "date_mid", "date_end", "date_year"]:
+                expected = as_float(record.get_interpreted(field))
+                value = as_float(results[field][i])
+                if math.isnan(expected):
+                    self.assertTrue(math.isnan(value), field)
+                else:
+                    self.assertEqual(value, expected, field)
+            for field in ["scientificName", "aphiaid", "marine"]:
+                self.assertEqual(results[field][i], record.get_interpreted(field))
+
+    def test_dict(self):
+        results = check_table(to_dict(DATA))
+        self.assert_matches_records(results)
+        self.assertEqual(int(results["flags"][3]) & FLAG_BITS[Flag.MIN_DEPTH_EXCEEDS_MAX], FLAG_BITS[Flag.MIN_DEPTH_EXCEEDS_MAX])
+        self.assertEqual(results["depth"][3], 12.5)
+
+    def test_taxon_cache(self):
+        cache = {}
+        check_table(to_dict(DATA), taxon_cache=cache)
+        self.assertIn((("scientificNameID", "abc"),), cache)
+        records = [Record(scientificNameID="abc")]
+        check(records, taxon_cache=cache)
+        self.assertIs(records[0].taxon, cache[(("scientificNameID", "abc"),)])
+
+    def test_metrics(self):
+        collector = Metrics()
+        check_table(to_dict(DATA), metrics=collector)
+        report = collector.report()
+        for stage in ["trim", "absence", "fields", "time", "taxonomy", "location"]:
+            self.assertGreaterEqual(report["timings"][stage], 0)
+        self.assertEqual(report["counts"]["records"], 5)
+        self.assertEqual(report["counts"]["time.unique"], 3)
+
+    def test_lengths(self):
+        with self.assertRaises(RuntimeError):
+            check_table({"eventDate": ["2010"], "decimalLongitude": ["1", "2"]})
+
+    @unittest.skipIf(pandas is None, "pandas is not installed")
+    def test_pandas(self):
+        df = pandas.DataFrame(to_dict(DATA), index=[10, 11, 12, 13, 14])
+        results = check_table(df)
+        self.assertIsInstance(results, pandas.DataFrame)
+        self.assertEqual(list(results.index), [10, 11, 12, 13, 14])
+        self.assert_matches_records(results.reset_index(drop=True).to_dict("list"))
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_arrow(self):
+        results = check_table(pyarrow.table(to_dict(DATA)))
+        self.assertIsInstance(results, pyarrow.Table)
+        self.assert_matches_records(results.to_pydict())
+
+
+if __name__ == "__main__":
+    unittest.main()
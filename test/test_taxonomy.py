@@ -353,6 +353,20 @@ class TestTaxonomy(unittest.TestCase):
     #     self.assertIn(Flag.NO_ACCEPTED_NAME, records[0].flags)
     #     self.assertTrue(records[0].get_interpreted("aphiaid") == 22747)
 
+    def test_cache(self):
+        cache = {}
+        records = [Record(scientificNameID="abc"), Record(scientificNameID="abc")]
+        taxonomy.check(records, cache=cache)
+        self.assertEqual(len(cache), 1)
+        taxon = list(cache.values())[0]
+        more_records = [Record(scientificNameID="abc")]
+        taxonomy.check(more_records, cache=cache)
+        self.assertEqual(len(cache), 1)
+        self.assertIs(list(cache.values())[0], taxon)
+        self.assertIn(Flag.NO_MATCH, more_records[0].flags)
+        self.assertTrue(more_records[0].is_invalid("scientificNameID"))
+        self.assertTrue(more_records[0].dropped)
+
     def test_whitespace(self):
         records = [
             Record(scientificName="Illex illecebrosus", scientificNameID="urn:lsid:marinespecies.org:taxname:153087 ")
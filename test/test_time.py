@@ -1,4 +1,5 @@
 import unittest
+import random
 from obisqc import time
 from obisqc.util.flags import Flag
 from obisqc.model import Record
@@ -103,6 +104,52 @@ class TestTime(unittest.TestCase):
         self.assertTrue(records[0].is_missing("eventDate"))
         self.assertFalse(records[0].dropped)
 
+    def test_cache(self):
+        time.cache.clear()
+        records = [Record(eventDate="2010-01-01"), Record(eventDate="2010-01-01"), Record(eventDate="2300"), Record(eventDate="abc")]
+        time.check(records)
+        self.assertEqual(time.cache.stats()["misses"], 3)
+        self.assertEqual(time.cache.stats()["hits"], 0)
+        more_records = [Record(eventDate="2010-01-01"), Record(eventDate="2300")]
+        time.check(more_records)
+        self.assertEqual(time.cache.stats()["hits"], 2)
+        self.assertEqual(records[1].get_interpreted("date_start"), 1262304000000)
+        self.assertEqual(more_records[0].get_interpreted("date_start"), 1262304000000)
+        self.assertEqual(more_records[0].get_interpreted("date_year"), 2010)
+        self.assertIn(Flag.DATE_IN_FUTURE, more_records[1].flags)
+        self.assertTrue(more_records[1].is_invalid("eventDate"))
+        self.assertTrue(records[3].is_invalid("eventDate"))
+
+    def test_interpret_columns(self):
+        corpus = [
+            "2010", "2010-06", "2010-02", "2012-02", "2010-06-01", "2010-06-01T10:20:30", "2010/2012", "2010-01-01/2012-01-01",
+            "2010-06-01/2010-06-15", "2010-06-01T10:00:00/2010-06-01T12:00:00", "1970-01-01T00:00:00", "1969-12-31", "1582-10-15",
+            "1500", "0001-04-11", "0000", "2300", "2006-01-29T11:49:00/2188-09-15T00:50:59", "2010-02-30", "2012-02-29",
+            "2011-02-29", "2010-13", "2010-00", "2010-06-00", "2012-01-01/2010-01-01", "2010-06/2010-05", "12 January 1928",
+            "2010-06-01T10:00:00Z", "2010-06-01T10:00:00+02:00", "2010-06-01T25:00:00", "2010-06-01T23:59:59",
+            "2010-06-01 10:00:00", " 2010", "2010-6-1", "20100601", "2010-06-01T10:00", "2010/06", "2010-06/07",
+            "2010-06-01/", "/2010", "2010-06-01/2010-06-01/2010-06-01", "9999-12-31", "1899-12-31/1900-01-01"
+        ]
+        rng = random.Random(1)
+        for _ in range(500):
+            start = f"{rng.randint(1600, 2030)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+            end = f"{rng.randint(2030, 2040)}-{rng.randint(1, 12):02d}"
+            corpus.extend([start, start[0:7], start[0:4], f"{start}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00", f"{start}/{end}"])
+        max_millis = time.today_millis()
+        for min_year in [1582, 1900]:
+            columns = time.interpret_columns(corpus, min_year, max_millis)
+            self.assertTrue(columns["fast"].sum() > len(corpus) * 0.9)
+            for i, event_date in enumerate(corpus):
+                expected = time.interpret(event_date, min_year, max_millis)
+                self.assertEqual(columns["invalid"][i], expected[5], event_date)
+                self.assertEqual(columns["flag"][i], expected[4], event_date)
+                if not expected[5]:
+                    self.assertEqual(
+                        (columns["date_start"][i], columns["date_mid"][i], columns["date_end"][i], columns["date_year"][i]),
+                        expected[0:4],
+                        event_date
+                    )
+
     # def test_bc_dates(self):
     #     records = [
     #         Record(eventDate="0000"),
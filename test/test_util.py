@@ -1,11 +1,57 @@
 import unittest
-from obisqc.util import aphia
+import csv
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from unittest import mock
+from obisqc.util import aphia, match_cache, metrics, misc, names, xylookup
+from obisqc.util.metrics import Metrics
+from obisqc.util.dwca import Archive, FIELD_SIZE_LIMIT
+from obisqc.util.xy_cache import XYCache
+from obisqc.util.areas import AreaIndex
+from obisqc.util.cache import LRUCache
+from obisqc.util.flags import Flag, FlagSet, add_flags
+from obisqc.util.sqlite import query_in
+from obisqc.model import Record, Taxon
+from test.worms import create_worms_db
+from test.xylookup_server import XYLookupServer, lookup_point
 import logging
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)-12s %(levelname)-8s %(message)s", datefmt="%H:%M:%S")
 logging.getLogger("urllib3").setLevel(logging.INFO)
 logging.getLogger("obisqc.util.aphia").setLevel(logging.INFO)
 
+META = """<archive xmlns="http://rs.tdwg.org/dwc/text/" metadata="eml.xml">
+  <core encoding="UTF-8" fieldsTerminatedBy="\\t" linesTerminatedBy="\\n" fieldsEnclosedBy="" ignoreHeaderLines="1" rowType="http://rs.tdwg.org/dwc/terms/Occurrence">
+    <files><location>occurrence.txt</location></files>
+    <id index="0" />
+    <field index="0" term="http://rs.tdwg.org/dwc/terms/occurrenceID"/>
+    <field index="1" term="http://rs.tdwg.org/dwc/terms/scientificName"/>
+    <field index="2" term="http://rs.tdwg.org/dwc/terms/eventDate"/>
+    <field term="http://rs.tdwg.org/dwc/terms/basisOfRecord" default="HumanObservation"/>
+  </core>
+  <extension encoding="UTF-8" fieldsTerminatedBy="," linesTerminatedBy="\\n" fieldsEnclosedBy="&quot;" ignoreHeaderLines="1" rowType="http://rs.iobis.org/obis/terms/ExtendedMeasurementOrFact">
+    <files><location>extendedmeasurementorfact.txt</location></files>
+    <coreid index="0" />
+    <field index="1" term="http://rs.tdwg.org/dwc/terms/measurementType"/>
+    <field index="2" term="http://rs.tdwg.org/dwc/terms/measurementValue"/>
+  </extension>
+</archive>"""
+
+OCCURRENCE = "id\tscientificName\teventDate\nocc_2\tAbra alba\t2010-01-01\nocc_1\tQuoted \"name\"\t\nocc_3\t\t2011\n"
+
+EMOF = 'id,measurementType,measurementValue\nocc_1,length,"1,5"\nocc_2,weight,3\nocc_1,"sex",female\n'
+
+
+def create_archive(path: str) -> None:
+    import zipfile
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("meta.xml", META)
+        archive.writestr("occurrence.txt", OCCURRENCE)
+        archive.writestr("extendedmeasurementorfact.txt", EMOF)
+
 
 class TestUtil(unittest.TestCase):
 
@@ -32,6 +78,340 @@ class TestUtil(unittest.TestCase):
         id = aphia.parse_scientificnameid("urn:lsid:marinespecies.org:taxname:123456")
         self.assertEqual(id, 123456)
 
+    def test_annotated_list(self):
+        entry = {"scientificname": None, "scientificnameid": None, "phylum": None, "class": None, "order": None, "family": None, "genus": None, "annotation_resolved_aphiaid": None}
+        entries = [
+            dict(entry, scientificname="Vinundu guellemei", annotation_type="white: human intervention: resolvable to aphiaid", annotation_resolved_aphiaid="1060834"),
+            dict(entry, scientificname="Vinundu guellemei", annotation_type="black: no biota"),
+            dict(entry, scientificname="NA", phylum="Ciliophora", annotation_type="Black: unresolvable, looks like a scientific name"),
+            dict(entry, scientificname="unknown", annotation_type="purple")
+        ]
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "annotations.json")
+            with open(path, "w") as f:
+                json.dump({"version": aphia.ANNOTATED_LIST_SNAPSHOT_VERSION, "created": "2024-01-01", "results": entries}, f)
+            os.environ["ANNOTATED_LIST_PATH"] = path
+            aphia.annotated_list = None
+            try:
+                taxa = {i: Taxon() for i in range(4)}
+                taxa[0].set("scientificName", "Vinundu guellemei")
+                taxa[1].set("scientificName", "NA")
+                taxa[1].set("phylum", "Ciliophora")
+                taxa[2].set("scientificName", "NA")
+                taxa[3].set("scientificName", "Abra alba")
+                aphia.check_annotated_list(taxa)
+                self.assertEqual(taxa[0].aphiaid, 1060834)
+                self.assertEqual(list(taxa[0].flags), [Flag.WORMS_ANNOTATION_RESOLVABLE])
+                self.assertIsNone(taxa[1].aphiaid)
+                self.assertEqual(list(taxa[1].flags), [Flag.WORMS_ANNOTATION_UNRESOLVABLE])
+                self.assertEqual(len(taxa[2].flags), 0)
+                self.assertEqual(len(taxa[3].flags), 0)
+                taxa = {0: Taxon()}
+                taxa[0].set("scientificName", "unknown")
+                with self.assertRaises(RuntimeError):
+                    aphia.check_annotated_list(taxa)
+            finally:
+                del os.environ["ANNOTATED_LIST_PATH"]
+                aphia.annotated_list = None
+
+    def test_parse_names(self):
+        names.cache.clear()
+        parsed = names.parse_names(["Abra alba (W. Wood, 1802)", "not a name", "Abra alba (W. Wood, 1802)"])
+        self.assertEqual(parsed, [("Abra alba", "(W. Wood 1802)"), (None, None), ("Abra alba", "(W. Wood 1802)")])
+        self.assertEqual(names.cache.stats()["misses"], 2)
+        self.assertEqual(names.cache.stats()["hits"], 0)
+        parsed = names.parse_names(["not a name", "Abra Lamarck, 1818"])
+        self.assertEqual(parsed, [(None, None), ("Abra", "Lamarck 1818")])
+        self.assertEqual(names.cache.stats()["misses"], 3)
+        self.assertEqual(names.cache.stats()["hits"], 1)
+
+    def test_lru_cache(self):
+        cache = LRUCache(maxsize=2)
+        cache.put("a", ("a", None))
+        cache.put("b", ("b", None))
+        self.assertEqual(cache.get("a"), ("a", None))
+        cache.put("c", ("c", None))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), ("a", None))
+        self.assertEqual(cache.stats()["size"], 2)
+        self.assertEqual(cache.stats()["hit_ratio"], 2 / 3)
+
+    def test_lru_cache_threads(self):
+        cache = LRUCache(maxsize=50)
+
+        def run(n):
+            for i in range(2000):
+                cache.put((n, i % 100), i)
+                cache.get((n, (i + 1) % 100))
+
+        threads = [threading.Thread(target=run, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(cache.stats()["size"], 50)
+        self.assertEqual(cache.hits + cache.misses, 8000)
+
+    def test_flagset(self):
+        flags = FlagSet()
+        self.assertEqual(len(flags), 0)
+        self.assertFalse(flags)
+        flags.add(Flag.NO_DEPTH)
+        flags.add(Flag.NO_COORD)
+        flags.add(Flag.NO_DEPTH)
+        self.assertEqual(len(flags), 2)
+        self.assertIn(Flag.NO_DEPTH, flags)
+        self.assertNotIn(Flag.ON_LAND, flags)
+        self.assertEqual(list(flags), [Flag.NO_COORD, Flag.NO_DEPTH])
+        self.assertEqual(flags, [Flag.NO_DEPTH, Flag.NO_COORD])
+        self.assertEqual(flags | [Flag.ON_LAND], FlagSet([Flag.NO_COORD, Flag.NO_DEPTH, Flag.ON_LAND]))
+
+    def test_add_flags(self):
+        records = [Record(), Record()]
+        records[0].set_flag(Flag.NO_COORD)
+        add_flags(records, FlagSet([Flag.NO_MATCH, Flag.NO_COORD]))
+        self.assertEqual(list(records[0].flags), [Flag.NO_COORD, Flag.NO_MATCH])
+        self.assertEqual(list(records[1].flags), [Flag.NO_COORD, Flag.NO_MATCH])
+
+    def test_xy_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "xylookup.db")
+            cache = XYCache(path, precision=2)
+            self.assertEqual(cache.key(1.23456, -45.6789), (1.23, -45.68))
+            cache.put_many({(1.23, -45.68): {"shoredistance": 10}})
+            cache.close()
+
+            cache = XYCache(path, precision=2)
+            self.assertEqual(cache.get_many([(1.23, -45.68), (0.0, 0.0)]), {(1.23, -45.68): {"shoredistance": 10}})
+            cache.close()
+
+    def test_xy_cache_threads(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = XYCache(os.path.join(tmp, "xylookup.db"))
+            cache.put_many({(1.0, 2.0): {"shoredistance": 10}})
+            errors = []
+
+            def run(n):
+                try:
+                    cache.put_many({(float(n), 0.0): {"shoredistance": n}})
+                    cache.memory.clear()
+                    cache.get_many([(1.0, 2.0), (float(n), 0.0)])
+                except Exception as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=run, args=(n,)) for n in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(errors, [])
+            self.assertEqual(len(cache.connections), 5)
+            cache.close()
+            self.assertEqual(cache.connections, [])
+            self.assertEqual(cache.get_many([(3.0, 0.0)]), {(3.0, 0.0): {"shoredistance": 3}})
+            cache.close()
+
+    def test_do_xylookup(self):
+        records = [Record(), Record(), Record(), Record()]
+        for record, (lon, lat) in zip(records, [(1.0, 2.0), (1.0, 2.0), (None, None), (3.0, 4.0)]):
+            record.set_interpreted("decimalLongitude", lon)
+            record.set_interpreted("decimalLatitude", lat)
+        cache = XYCache()
+        with mock.patch.object(misc.xylookup, "lookup", side_effect=lambda points: [{"shoredistance": x} for x, y in points]) as lookup:
+            output = misc.do_xylookup(records, cache=cache)
+            self.assertEqual(lookup.call_args[0][0], [(1.0, 2.0), (3.0, 4.0)])
+            self.assertEqual(output, [{"shoredistance": 1.0}, {"shoredistance": 1.0}, None, {"shoredistance": 3.0}])
+            misc.do_xylookup(records, cache=cache)
+            self.assertEqual(lookup.call_count, 1)
+
+    def test_xylookup_batches(self):
+        server = XYLookupServer().start()
+        try:
+            points = [(float(lon), float(lat)) for lon in range(-20, 20) for lat in range(-5, 5)]
+            results = xylookup.lookup(points, batch_size=7, workers=4, url=server.url)
+            self.assertEqual(results, [lookup_point(lon, lat) for lon, lat in points])
+            self.assertEqual(server.requests, 58)
+            self.assertEqual(xylookup.lookup([], url=server.url), [])
+        finally:
+            server.stop()
+
+    def test_xylookup_retries(self):
+        server = XYLookupServer(failures=2).start()
+        try:
+            results = xylookup.lookup([(1.0, 2.0)], retries=3, backoff=0, url=server.url)
+            self.assertEqual(results, [lookup_point(1.0, 2.0)])
+            self.assertEqual(server.requests, 3)
+            server.failures = 3
+            with self.assertRaises(RuntimeError):
+                xylookup.lookup([(1.0, 2.0)], retries=3, backoff=0, url=server.url)
+        finally:
+            server.stop()
+
+    def test_metrics_threads(self):
+        server = XYLookupServer(failures=1).start()
+        try:
+            def run(n, collected):
+                with metrics.collect(collected):
+                    metrics.count("records", n)
+                    xylookup.lookup([(float(i), 0.0) for i in range(n)], batch_size=1, workers=4, retries=2, backoff=0, url=server.url)
+
+            collected = [Metrics(), Metrics()]
+            threads = [threading.Thread(target=run, args=(n, m)) for n, m in zip([3, 5], collected)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual([m.counts["records"] for m in collected], [3, 5])
+            self.assertEqual([m.counts["xylookup.batches"] for m in collected], [3, 5])
+            self.assertEqual(sum(m.counts["xylookup.failures"] for m in collected), 1)
+            self.assertIsNone(metrics.collector.get())
+        finally:
+            server.stop()
+
+    def test_area_index(self):
+        square = [[[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]], [[4, 4], [6, 4], [6, 6], [4, 6], [4, 4]]]
+        index = AreaIndex(cell_size=3)
+        index.add_layer("eez", {"type": "FeatureCollection", "features": [
+            {"type": "Feature", "properties": {"id": 1, "name": "Square"}, "geometry": {"type": "Polygon", "coordinates": square}},
+            {"type": "Feature", "properties": {"id": 2, "name": "Islands"}, "geometry": {"type": "MultiPolygon", "coordinates": [
+                [[[20, 20], [21, 20], [21, 21], [20, 20]]],
+                [[[-170, -50], [-160, -50], [-165, -40], [-170, -50]]]
+            ]}}
+        ]})
+        index.add_layer("iho", {"type": "FeatureCollection", "features": [
+            {"type": "Feature", "properties": {"id": "north"}, "geometry": {"type": "Polygon", "coordinates": [[[-180, 0], [180, 0], [180, 90], [-180, 90], [-180, 0]]]}}
+        ]})
+        index.build()
+        results = index.query([1, 5, 20.9, -165, 50, 9.9], [1, 5, 20.1, -45, -50, 9.9])
+        self.assertEqual(results, [
+            {"eez": [{"id": 1, "name": "Square"}], "iho": [{"id": "north", "name": None}]},
+            {"iho": [{"id": "north", "name": None}]},
+            {"eez": [{"id": 2, "name": "Islands"}], "iho": [{"id": "north", "name": None}]},
+            {"eez": [{"id": 2, "name": "Islands"}]},
+            {},
+            {"eez": [{"id": 1, "name": "Square"}], "iho": [{"id": "north", "name": None}]}
+        ])
+
+    def test_dwca(self):
+        with tempfile.TemporaryDirectory() as path:
+            create_archive(os.path.join(path, "archive.zip"))
+            with Archive(os.path.join(path, "archive.zip")) as archive:
+                self.assertEqual(archive.core.name, "occurrence")
+                self.assertEqual(archive.extensions[0].name, "emof")
+                chunks = list(archive.chunks(chunk_size=2))
+                index_path = archive.tempfile
+            self.assertFalse(os.path.exists(index_path))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+        records = [record for chunk in chunks for record in chunk]
+        self.assertEqual([record.extras["id"] for record in records], ["occ_2", "occ_1", "occ_3"])
+        self.assertEqual(records[0].get("scientificName"), "Abra alba")
+        self.assertEqual(records[0].get("basisOfRecord"), "HumanObservation")
+        self.assertEqual(records[1].get("scientificName"), 'Quoted "name"')
+        self.assertIsNone(records[1].get("eventDate"))
+        self.assertEqual([(emof.get("measurementType"), emof.get("measurementValue")) for emof in records[1].extensions["emof"]], [("length", "1,5"), ("sex", "female")])
+        self.assertEqual(records[0].extensions["emof"][0].type, "emof")
+        self.assertIsNone(records[2]._extensions)
+        self.assertEqual(csv.field_size_limit(), FIELD_SIZE_LIMIT)
+
+
+class TestWorms(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tempdir = tempfile.TemporaryDirectory()
+        cls.worms_db_path = os.environ.get("WORMS_DB_PATH")
+        os.environ["WORMS_DB_PATH"] = os.path.join(cls.tempdir.name, "worms.db")
+        create_worms_db(os.environ["WORMS_DB_PATH"])
+
+    @classmethod
+    def tearDownClass(cls):
+        aphia.close_connection()
+        if cls.worms_db_path is None:
+            del os.environ["WORMS_DB_PATH"]
+        else:
+            os.environ["WORMS_DB_PATH"] = cls.worms_db_path
+        cls.tempdir.cleanup()
+
+    def test_fetch(self):
+        taxa = {}
+        for aphiaid in [141433, 384046, 1000001, 999999999, None]:
+            taxa[aphiaid] = Taxon()
+            taxa[aphiaid].aphiaid = aphiaid
+        aphia.fetch(taxa)
+        self.assertEqual(taxa[141433].aphia_info["record"]["scientificname"], "Abra alba")
+        self.assertIsNone(taxa[141433].aphia_info_accepted)
+        self.assertEqual(taxa[384046].aphia_info["record"]["scientificname"], "Orca gladiator")
+        self.assertEqual(taxa[384046].aphia_info_accepted["record"]["scientificname"], "Orcinus orca")
+        self.assertIsNotNone(taxa[1000001].aphia_info)
+        self.assertIsNone(taxa[1000001].aphia_info_accepted)
+        self.assertIsNone(taxa[999999999].aphia_info)
+        self.assertIsNone(taxa[None].aphia_info)
+
+    def test_fetch_aphia(self):
+        self.assertEqual(aphia.fetch_aphia(141433)["record"]["AphiaID"], 141433)
+        self.assertIsNone(aphia.fetch_aphia(999999999)["record"])
+        self.assertEqual(list(aphia.fetch_aphia_bulk(aphia.get_connection().cursor(), ["141433"]).keys()), [141433])
+
+    def test_connection(self):
+        con = aphia.get_connection()
+        self.assertIs(aphia.get_connection(), con)
+        with self.assertRaises(sqlite3.OperationalError):
+            con.execute("delete from parsed")
+        other = []
+        thread = threading.Thread(target=lambda: other.append(aphia.get_connection()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], con)
+
+    def test_connection_after_fork(self):
+        con = aphia.get_connection()
+        aphia.connections.pid = -1
+        self.assertIsNot(aphia.get_connection(), con)
+        self.assertIs(aphia.inherited_connections[-1], con)
+        self.assertEqual(aphia.fetch_aphia(141433)["record"]["AphiaID"], 141433)
+
+    def test_match_with_sqlite(self):
+        names = ["Abra alba", "Abra alba (W. Wood 1802)", "Abra alba W. Wood 1802", "Orca gladiator", "not a name"]
+        names = names + ["Genus%s species" % i for i in range(1200)]
+        matches = aphia.match_with_sqlite(names)
+        self.assertEqual(len(matches), len(names))
+        self.assertEqual([match["aphiaid"] for match in matches[0]], [141433])
+        self.assertEqual([match["aphiaid"] for match in matches[1]], [141433])
+        self.assertEqual(matches[2], [])
+        self.assertEqual(matches[3][0]["valid_aphiaid"], 137102)
+        self.assertEqual(matches[4], [])
+        self.assertEqual(matches[5], [])
+
+    def test_match_cache(self):
+        cache_path = os.path.join(self.tempdir.name, "matches.db")
+        os.environ["WORMS_MATCH_CACHE_PATH"] = cache_path
+        try:
+            names.cache.clear()
+            matches = aphia.match_names(["Abra alba", "Orca gladiator", "Abra alba"])
+            self.assertEqual(matches[0][0]["aphiaid"], 141433)
+            self.assertEqual(matches[2], matches[0])
+            misses = names.cache.stats()["misses"]
+            matches = aphia.match_names(["Orca gladiator", "Abra alba"])
+            self.assertEqual(matches[0][0]["aphiaid"], 384046)
+            self.assertEqual(matches[1][0]["aphiaid"], 141433)
+            self.assertEqual(names.cache.stats()["misses"], misses)
+            self.assertEqual(names.cache.stats()["hits"], 0)
+            cache = match_cache.open_match_cache()
+            self.assertEqual(len(cache.get_many(["Abra alba", "Orca gladiator"])), 2)
+            cache.con.execute("update meta set value = 'outdated'")
+            cache.con.commit()
+            cache.close()
+            cache = match_cache.open_match_cache()
+            self.assertEqual(len(cache.get_many(["Abra alba", "Orca gladiator"])), 0)
+            cache.close()
+        finally:
+            del os.environ["WORMS_MATCH_CACHE_PATH"]
+
+    def test_query_in(self):
+        cur = aphia.get_connection().cursor()
+        rows = query_in(cur, "select aphiaid from parsed where aphiaid in ({placeholders})", list(range(1200)) + [141433, 137102])
+        self.assertEqual(sorted([row["aphiaid"] for row in rows]), [137102, 141433])
+
 
 if __name__ == "__main__":
     unittest.main()
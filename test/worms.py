@@ -0,0 +1,34 @@
+import gnparser
+import json
+import sqlite3
+
+
+TAXA = [
+    {"AphiaID": 141433, "valid_AphiaID": 141433, "scientificname": "Abra alba", "authority": "(W. Wood, 1802)", "status": "accepted", "rank": "Species", "kingdom": "Animalia", "phylum": "Mollusca", "class": "Bivalvia", "order": "Cardiida", "family": "Semelidae", "genus": "Abra", "isMarine": 1, "isBrackish": 0, "isTerrestrial": 0},
+    {"AphiaID": 138474, "valid_AphiaID": 138474, "scientificname": "Abra", "authority": "Lamarck, 1818", "status": "accepted", "rank": "Genus", "kingdom": "Animalia", "phylum": "Mollusca", "class": "Bivalvia", "order": "Cardiida", "family": "Semelidae", "genus": "Abra", "isMarine": 1, "isBrackish": 0, "isTerrestrial": 0},
+    {"AphiaID": 137102, "valid_AphiaID": 137102, "scientificname": "Orcinus orca", "authority": "(Linnaeus, 1758)", "status": "accepted", "rank": "Species", "kingdom": "Animalia", "phylum": "Chordata", "class": "Mammalia", "order": "Cetartiodactyla", "family": "Delphinidae", "genus": "Orcinus", "isMarine": 1, "isBrackish": None, "isTerrestrial": 0},
+    {"AphiaID": 384046, "valid_AphiaID": 137102, "scientificname": "Orca gladiator", "authority": "(Bonnaterre, 1789)", "status": "unaccepted", "rank": "Species", "kingdom": "Animalia", "phylum": "Chordata", "class": "Mammalia", "order": "Cetartiodactyla", "family": "Delphinidae", "genus": "Orca", "isMarine": 1, "isBrackish": None, "isTerrestrial": 0},
+    {"AphiaID": 1064018, "valid_AphiaID": 1064018, "scientificname": "Punctum minutissimum", "authority": "(I. Lea, 1841)", "status": "accepted", "rank": "Species", "kingdom": "Animalia", "phylum": "Mollusca", "class": "Gastropoda", "order": "Stylommatophora", "family": "Punctidae", "genus": "Punctum", "isMarine": 0, "isBrackish": 0, "isTerrestrial": 1},
+    {"AphiaID": 1000001, "valid_AphiaID": 1000002, "scientificname": "Nullus orphanus", "authority": "Smith, 2000", "status": "unaccepted", "rank": "Species", "kingdom": "Animalia", "phylum": "Mollusca", "class": "Bivalvia", "order": None, "family": None, "genus": "Nullus", "isMarine": None, "isBrackish": None, "isTerrestrial": None}
+]
+
+
+def create_worms_db(path: str, taxa: list = TAXA) -> None:
+    """Create a minimal WoRMS database with the parsed table used by obisqc.util.aphia."""
+    con = sqlite3.connect(path)
+    con.execute("create table parsed (aphiaid integer, canonical text, authorship text, valid_aphiaid integer, record text, bold_id text, ncbi_id text)")
+    con.execute("create index parsed_aphiaid on parsed (aphiaid)")
+    con.execute("create index parsed_canonical on parsed (canonical)")
+    for taxon in taxa:
+        parsed = json.loads(gnparser.parse_to_string(f"{taxon['scientificname']} {taxon['authority']}", "compact", None, 1, 1))
+        con.execute("insert into parsed values (?, ?, ?, ?, ?, ?, ?)", (
+            taxon["AphiaID"],
+            parsed["canonical"]["full"],
+            parsed["authorship"]["normalized"],
+            taxon["valid_AphiaID"],
+            json.dumps(taxon),
+            None,
+            None
+        ))
+    con.commit()
+    con.close()
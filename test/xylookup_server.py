@@ -0,0 +1,87 @@
+"""Local stand-in for the xylookup service, for testing the xylookup client offline.
+
+Usage: python -m test.xylookup_server [port]
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import math
+import sys
+import threading
+import time
+import msgpack
+
+
+def lookup_point(lon: float, lat: float) -> dict:
+    """Deterministic fake xylookup result, land north of 60 degrees latitude."""
+    on_land = lat > 60
+    return {
+        "shoredistance": -1000 if on_land else round(abs(lat) * 1000 + abs(lon) * 100),
+        "grids": {
+            "bathymetry": -100.0 if on_land else round(1000 + 100 * math.sin(math.radians(lon)), 2),
+            "sstemperature": round(28 - abs(lat) / 3, 2),
+            "sssalinity": 35.0
+        },
+        "areas": {
+            "final_grid5": [{"id": int((lon + 180) // 5) * 36 + int((lat + 90) // 5), "name": None}]
+        }
+    }
+
+
+class XYLookupServer(ThreadingHTTPServer):
+    """Threaded xylookup server. The first failures requests are answered with a 503, and every request waits delay
+    seconds before responding."""
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, failures: int = 0, delay: float = 0):
+        super().__init__(("127.0.0.1", port), XYLookupHandler)
+        self.failures = failures
+        self.delay = delay
+        self.requests = 0
+        self.points = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/xylookup/"
+
+    def start(self) -> "XYLookupServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class XYLookupHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        data = msgpack.loads(self.rfile.read(int(self.headers["Content-Length"])), raw=False)
+        with self.server.lock:
+            self.server.requests += 1
+            fail = self.server.failures > 0
+            if fail:
+                self.server.failures -= 1
+            else:
+                self.server.points += len(data["points"])
+        if self.server.delay > 0:
+            time.sleep(self.server.delay)
+        if fail:
+            self.send_response(503)
+            self.end_headers()
+            return
+        body = msgpack.dumps([lookup_point(lon, lat) for lon, lat in data["points"]])
+        self.send_response(200)
+        self.send_header("Content-Type", "application/msgpack")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    server = XYLookupServer(int(sys.argv[1]) if len(sys.argv) > 1 else 8080)
+    print(f"Serving at {server.url}")
+    server.serve_forever()